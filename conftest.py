@@ -0,0 +1,12 @@
+import tempfile
+
+import pytest
+from django.test import override_settings
+
+
+@pytest.fixture(autouse=True, scope="session")
+def metrics_dir():
+    """Keep the metrics files written by test requests out of the tree."""
+    with tempfile.TemporaryDirectory() as directory:
+        with override_settings(METRICS_DIR=directory):
+            yield directory
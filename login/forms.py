@@ -78,10 +78,7 @@ class QuestionForm(forms.Form):
     def __init__(self, questions, *args, **kwargs):
         super().__init__(*args, **kwargs)
         for question in questions:
-            choices = [
-                (choice.id, choice.text)
-                for choice in question.choice_set.all()
-            ]
+            choices = [(choice.id, choice.text) for choice in question.choices]
             self.fields[f"question_{question.id}"] = forms.ChoiceField(
                 label=question.text,
                 choices=choices,
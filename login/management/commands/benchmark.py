@@ -0,0 +1,162 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import (
+    override_settings,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+
+from login.utils.benchmark import (
+    BENCHMARK_USERS,
+    Scenarios,
+    baseline_metrics,
+    compare,
+    measure,
+    seed_benchmark_data,
+)
+from polls.votes import VoteBuffer
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure latency, query count and memory of the main views against "
+        "a throwaway test database, and compare them to a JSON baseline: "
+        "the shared one holds query counts, a --local one all metrics."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--baseline",
+            help="Path of the JSON baseline. Defaults to "
+            "benchmarks/baseline.json, or benchmarks/baseline.local.json "
+            "with --local.",
+        )
+        parser.add_argument(
+            "--local",
+            action="store_true",
+            help="Use the baseline of this machine, which also holds latency "
+            "and memory.",
+        )
+        parser.add_argument(
+            "--save",
+            action="store_true",
+            help="Write the results as the new baseline instead of comparing.",
+        )
+        parser.add_argument(
+            "--iterations",
+            type=int,
+            default=50,
+            help="Measured samples per scenario.",
+        )
+        parser.add_argument(
+            "--warmup",
+            type=int,
+            default=3,
+            help="Unmeasured samples run first.",
+        )
+        parser.add_argument(
+            "--questions",
+            type=int,
+            default=10,
+            help="Number of questions of the benchmark quiz.",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help="Allowed fractional increase of latency and memory.",
+        )
+        parser.add_argument(
+            "--query-tolerance",
+            type=float,
+            default=0.0,
+            help="Allowed fractional increase of the query count.",
+        )
+        parser.add_argument(
+            "--min-delta-ms",
+            type=float,
+            default=5.0,
+            help="Smallest latency increase, in ms, reported as a regression.",
+        )
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=Scenarios.NAMES,
+            help="Run only this scenario. May be repeated.",
+        )
+
+    def run_scenarios(self, options):
+        quiz, poll = seed_benchmark_data(BENCHMARK_USERS, options["questions"])
+        scenarios = Scenarios(quiz, poll)
+        scenarios.prepare_result()
+
+        results = {}
+        for name in options["scenario"] or Scenarios.NAMES:
+            results[name] = measure(
+                getattr(scenarios, name),
+                options["iterations"],
+                options["warmup"],
+                getattr(scenarios, f"setup_{name}", None),
+            )
+            self.stdout.write(
+                f"{name:<15}"
+                + "".join(
+                    f"{metric}={value:<10}"
+                    for metric, value in results[name].items()
+                )
+            )
+        return results
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            # Votes and metrics are written to throwaway directories too.
+            with tempfile.TemporaryDirectory() as votes:
+                with tempfile.TemporaryDirectory() as metrics:
+                    with patch(
+                        "polls.views.vote_buffer", VoteBuffer(votes)
+                    ), override_settings(METRICS_DIR=metrics):
+                        results = self.run_scenarios(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        name = "baseline.local.json" if options["local"] else "baseline.json"
+        baseline_path = Path(
+            options["baseline"] or settings.BASE_DIR / "benchmarks" / name
+        )
+        if options["save"]:
+            # Latency and memory only hold on the machine that measured them.
+            if not options["local"]:
+                results = baseline_metrics(results)
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2) + "\n")
+            self.stdout.write(
+                self.style.SUCCESS(f"Saved baseline to {baseline_path}.")
+            )
+            return
+
+        if not baseline_path.exists():
+            raise CommandError(
+                f"No baseline at {baseline_path}. Run with --save first."
+            )
+        regressions = compare(
+            results,
+            json.loads(baseline_path.read_text()),
+            options["tolerance"],
+            options["query_tolerance"],
+            options["min_delta_ms"],
+        )
+        if regressions:
+            raise CommandError(
+                "Performance regressions:\n" + "\n".join(regressions)
+            )
+        self.stdout.write(self.style.SUCCESS("No regressions."))
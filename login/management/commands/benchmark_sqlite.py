@@ -0,0 +1,147 @@
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from mysite.db import sqlite_pragmas
+
+
+def connect(path, pragmas):
+    connection = sqlite3.connect(path, timeout=0, isolation_level=None)
+    for statement in sqlite_pragmas(pragmas):
+        connection.execute(statement)
+    return connection
+
+
+def writer(path, pragmas, stop, burst_rows, hold):
+    """Insert bursts of rows, holding the write lock for `hold` seconds."""
+    connection = connect(path, pragmas)
+    bursts = 0
+    while not stop.is_set():
+        connection.execute("BEGIN IMMEDIATE")
+        connection.executemany(
+            "INSERT INTO vote (choice_id) VALUES (?)",
+            ((i % 10,) for i in range(burst_rows)),
+        )
+        time.sleep(hold)
+        connection.execute("COMMIT")
+        bursts += 1
+    connection.close()
+    return bursts
+
+
+def reader(path, pragmas, stop, latencies, errors):
+    connection = connect(path, pragmas)
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            connection.execute(
+                "SELECT choice_id, COUNT(*) FROM vote GROUP BY choice_id"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            errors.append(1)
+        else:
+            latencies.append(time.perf_counter() - started)
+    connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure reads on a scratch SQLite database while a writer runs "
+        "bursts of inserts, once per journal mode."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--journal-modes",
+            nargs="+",
+            default=["DELETE", "WAL"],
+            help="Journal modes to compare.",
+        )
+        parser.add_argument(
+            "--duration",
+            type=float,
+            default=3.0,
+            help="Seconds each journal mode is measured.",
+        )
+        parser.add_argument(
+            "--readers", type=int, default=4, help="Number of reader threads."
+        )
+        parser.add_argument(
+            "--burst-rows",
+            type=int,
+            default=500,
+            help="Rows inserted per write transaction.",
+        )
+        parser.add_argument(
+            "--hold",
+            type=float,
+            default=0.05,
+            help="Seconds each write transaction holds the lock.",
+        )
+
+    def run(self, journal_mode, options):
+        pragmas = dict(settings.SQLITE_PRAGMAS, journal_mode=journal_mode)
+        # Readers report lock errors instead of waiting for the writer.
+        reader_pragmas = dict(pragmas, busy_timeout=0)
+        with tempfile.TemporaryDirectory() as directory:
+            path = str(Path(directory) / "benchmark.sqlite3")
+            setup = connect(path, pragmas)
+            setup.execute(
+                "CREATE TABLE vote (id INTEGER PRIMARY KEY, choice_id INTEGER)"
+            )
+            setup.close()
+
+            stop = threading.Event()
+            latencies, errors, bursts = [], [], []
+            threads = [
+                threading.Thread(
+                    target=lambda: bursts.append(
+                        writer(
+                            path,
+                            pragmas,
+                            stop,
+                            options["burst_rows"],
+                            options["hold"],
+                        )
+                    )
+                )
+            ] + [
+                threading.Thread(
+                    target=reader,
+                    args=(path, reader_pragmas, stop, latencies, errors),
+                )
+                for _ in range(options["readers"])
+            ]
+            for thread in threads:
+                thread.start()
+            time.sleep(options["duration"])
+            stop.set()
+            for thread in threads:
+                thread.join()
+
+        return {
+            "reads": len(latencies),
+            "blocked": len(errors),
+            "bursts": sum(bursts),
+            "p50": statistics.median(latencies) * 1000 if latencies else 0,
+            "max": max(latencies) * 1000 if latencies else 0,
+        }
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'mode':<10}{'reads':>10}{'blocked':>10}{'bursts':>10}"
+            f"{'p50 ms':>10}{'max ms':>10}"
+        )
+        for journal_mode in options["journal_modes"]:
+            result = self.run(journal_mode, options)
+            self.stdout.write(
+                f"{journal_mode:<10}{result['reads']:>10}"
+                f"{result['blocked']:>10}{result['bursts']:>10}"
+                f"{result['p50']:>10.3f}{result['max']:>10.3f}"
+            )
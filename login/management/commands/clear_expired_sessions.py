@@ -0,0 +1,51 @@
+import time
+
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired sessions in small batches so the session table "
+        "is never locked for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of sessions deleted per statement.",
+        )
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.1,
+            help="Seconds to wait between batches.",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=0,
+            help="Stop after this many batches. 0 means no limit.",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        deleted = batches = 0
+        while not options["max_batches"] or batches < options["max_batches"]:
+            keys = list(
+                Session.objects.filter(expire_date__lt=now).values_list(
+                    "session_key", flat=True
+                )[: options["batch_size"]]
+            )
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            batches += 1
+            time.sleep(options["pause"])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Deleted {deleted} expired sessions.")
+        )
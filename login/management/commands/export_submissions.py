@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from login.models import Quiz
+from login.utils.export import EXPORT_FORMATS, iter_answer_rows
+
+
+class Command(BaseCommand):
+    help = "Export the submissions and answers of a quiz as CSV or JSONL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("quiz_id", type=int)
+        parser.add_argument(
+            "--format", choices=sorted(EXPORT_FORMATS), default="csv"
+        )
+        parser.add_argument(
+            "--output",
+            help="File to write to. Defaults to standard output.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of answers fetched from the database at a time.",
+        )
+
+    def handle(self, *args, **options):
+        if not Quiz.objects.filter(id=options["quiz_id"]).exists():
+            raise CommandError(f"Quiz {options['quiz_id']} does not exist.")
+
+        serialize, _ = EXPORT_FORMATS[options["format"]]
+        rows = iter_answer_rows(
+            options["quiz_id"], chunk_size=options["chunk_size"]
+        )
+        if options["output"]:
+            with open(
+                options["output"], "w", encoding="utf-8", newline=""
+            ) as output:
+                output.writelines(serialize(rows))
+        else:
+            for chunk in serialize(rows):
+                self.stdout.write(chunk, ending="")
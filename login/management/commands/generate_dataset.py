@@ -0,0 +1,100 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from login.utils.synthetic import SYNTHETIC_PASSWORD, generate_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic users, quizzes, submissions, "
+        "answers and poll votes for scale testing. The same seed and sizes "
+        "generate the same data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--quizzes", type=int, default=10)
+        parser.add_argument(
+            "--questions", type=int, default=20, help="Questions per quiz."
+        )
+        parser.add_argument(
+            "--choices", type=int, default=4, help="Choices per question."
+        )
+        parser.add_argument(
+            "--participation",
+            type=float,
+            default=0.5,
+            help="Average share of the users who take each quiz.",
+        )
+        parser.add_argument(
+            "--draft-rate",
+            type=float,
+            default=0.05,
+            help="Share of the submissions left unfinished.",
+        )
+        parser.add_argument(
+            "--grade",
+            action="store_true",
+            help="Also store results and rebuild the quiz analytics.",
+        )
+        parser.add_argument("--polls", type=int, default=50)
+        parser.add_argument(
+            "--poll-choices", type=int, default=4, help="Choices per poll."
+        )
+        parser.add_argument(
+            "--votes",
+            type=int,
+            default=100000,
+            help="Votes spread over all polls.",
+        )
+        parser.add_argument(
+            "--prefix", default="synthetic", help="Username prefix."
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Number of rows inserted at a time.",
+        )
+
+    def handle(self, *args, **options):
+        if options["questions"] < 1 or options["choices"] < 2:
+            raise CommandError(
+                "Quizzes need at least one question and two choices."
+            )
+        if User.objects.filter(
+            username__startswith=options["prefix"]
+        ).exists():
+            raise CommandError(
+                f"Users named {options['prefix']}* already exist; "
+                "use another --prefix."
+            )
+
+        started = time.perf_counter()
+        created = generate_dataset(
+            seed=options["seed"],
+            users=options["users"],
+            quizzes=options["quizzes"],
+            questions=options["questions"],
+            choices=options["choices"],
+            participation=options["participation"],
+            draft_rate=options["draft_rate"],
+            grade=options["grade"],
+            polls=options["polls"],
+            poll_choices=options["poll_choices"],
+            votes=options["votes"],
+            prefix=options["prefix"],
+            chunk_size=options["chunk_size"],
+        )
+        elapsed = time.perf_counter() - started
+        for name, count in created.items():
+            self.stdout.write(f"{name}: {count}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated in {elapsed:.1f}s. Users log in with the "
+                f"password {SYNTHETIC_PASSWORD!r}."
+            )
+        )
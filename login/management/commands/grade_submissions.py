@@ -0,0 +1,105 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from login.utils.grading import (
+    claim_grading_jobs,
+    requeue_failed_jobs,
+    run_grading_job,
+)
+
+
+class Command(BaseCommand):
+    help = "Grade queued quiz submissions."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Number of jobs claimed at a time.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=4,
+            help="Number of grading threads. 1 grades in the main thread.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=2.0,
+            help="Seconds to wait when the queue is empty.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=3,
+            help="Attempts before a job is marked as failed.",
+        )
+        parser.add_argument(
+            "--retry-after",
+            type=int,
+            default=60,
+            help="Seconds a job waits after a failed attempt.",
+        )
+        parser.add_argument(
+            "--requeue-failed",
+            action="store_true",
+            help="Give failed jobs a fresh set of attempts first.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain the queue and exit instead of polling forever.",
+        )
+
+    def handle(self, *args, **options):
+        if options["requeue_failed"]:
+            count = requeue_failed_jobs()
+            self.stdout.write(f"Requeued {count} failed jobs.")
+
+        workers = max(options["workers"], 1)
+        max_attempts = options["max_attempts"]
+
+        def grade(job):
+            try:
+                return run_grading_job(job, max_attempts=max_attempts)
+            finally:
+                if workers > 1:
+                    close_old_connections()
+
+        executor = ThreadPoolExecutor(workers) if workers > 1 else None
+        graded = failed = 0
+        try:
+            while True:
+                jobs = claim_grading_jobs(
+                    options["batch_size"], retry_after=options["retry_after"]
+                )
+                if not jobs:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+
+                outcomes = (
+                    executor.map(grade, jobs) if executor else map(grade, jobs)
+                )
+                for ok in outcomes:
+                    if ok:
+                        graded += 1
+                    else:
+                        failed += 1
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if executor:
+                executor.shutdown()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Graded {graded} submissions, {failed} failed."
+            )
+        )
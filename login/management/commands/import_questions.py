@@ -0,0 +1,54 @@
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from login.utils.question_import import import_questions, read_csv, read_jsonl
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+class Command(BaseCommand):
+    help = (
+        "Import questions, choices and quiz membership from a CSV or JSONL "
+        "file. Each chunk is committed on its own, so run with --dry-run "
+        "first to validate the whole file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import.")
+        parser.add_argument(
+            "--format",
+            choices=sorted(READERS),
+            help="File format. Defaults to the file extension.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of questions inserted at a time.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Validate the file without writing anything.",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        file_format = options["format"] or path.suffix.lstrip(".").lower()
+        if file_format not in READERS:
+            raise CommandError(f"Unsupported file format: {file_format}")
+
+        with path.open(encoding="utf-8", newline="") as lines:
+            try:
+                count = import_questions(
+                    READERS[file_format](lines),
+                    chunk_size=options["chunk_size"],
+                    dry_run=options["dry_run"],
+                )
+            except ValidationError as error:
+                raise CommandError(error.message)
+
+        action = "Validated" if options["dry_run"] else "Imported"
+        self.stdout.write(self.style.SUCCESS(f"{action} {count} questions."))
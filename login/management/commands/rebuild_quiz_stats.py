@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from login.models import Quiz
+from login.utils.analytics import rebuild_quiz_stats
+from login.utils.quiz_cache import get_quiz_snapshot
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-question analytics counters from stored results."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "quiz_ids",
+            nargs="*",
+            type=int,
+            help="Quizzes to rebuild. Defaults to every quiz.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Number of results read and rows written at a time.",
+        )
+
+    def handle(self, *args, **options):
+        quiz_ids = options["quiz_ids"] or list(
+            Quiz.objects.values_list("id", flat=True)
+        )
+        for quiz_id in quiz_ids:
+            rebuild_quiz_stats(
+                get_quiz_snapshot(quiz_id), chunk_size=options["chunk_size"]
+            )
+            self.stdout.write(f"Rebuilt analytics for quiz {quiz_id}.")
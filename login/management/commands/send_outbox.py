@@ -0,0 +1,69 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+
+from login.utils.outbox import deliver_outbox
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Send queued emails from the outbox."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of messages sent over one mail connection.",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Attempts before a message is dead-lettered.",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Seconds to wait when the outbox is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Send every due message and exit instead of polling.",
+        )
+
+    def handle(self, *args, **options):
+        total_sent = total_failed = 0
+        try:
+            while True:
+                try:
+                    sent, failed = deliver_outbox(
+                        batch_size=options["batch_size"],
+                        max_attempts=options["max_attempts"],
+                    )
+                except Exception:
+                    # E.g. the database is unavailable; claimed messages
+                    # are claimed again once their lease expires.
+                    logger.exception("Outbox batch failed")
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+                    continue
+                total_sent += sent
+                total_failed += failed
+                if not sent and not failed:
+                    if options["once"]:
+                        break
+                    time.sleep(options["poll_interval"])
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Sent {total_sent} emails, {total_failed} failed."
+            )
+        )
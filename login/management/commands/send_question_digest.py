@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from login.utils.notifications import send_question_digest
+
+
+class Command(BaseCommand):
+    help = (
+        "Queue one email per user about the questions added since the last "
+        "digest. Run it periodically, e.g. hourly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of recipients queued at a time.",
+        )
+
+    def handle(self, *args, **options):
+        questions, emails = send_question_digest(
+            chunk_size=options["chunk_size"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Queued {emails} emails about {questions} new questions."
+            )
+        )
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0009_choice_is_correct'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuizResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0)),
+                ('correct_count', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('outcomes', models.JSONField(default=list)),
+                ('graded_at', models.DateTimeField(auto_now=True)),
+                ('submission', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='result', to='login.quizsubmission')),
+            ],
+        ),
+    ]
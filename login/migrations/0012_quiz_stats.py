@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0011_gradingjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChoiceStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('picks', models.PositiveIntegerField(default=0)),
+                ('choice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='login.choice')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='login.quiz')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'choice'), name='unique_choice_stat')],
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('correct_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.FloatField(default=0)),
+                ('score_sq_sum', models.FloatField(default=0)),
+                ('correct_score_sum', models.FloatField(default=0)),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='login.question')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='login.quiz')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('quiz', 'question'), name='unique_question_stat')],
+            },
+        ),
+    ]
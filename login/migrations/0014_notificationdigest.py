@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0013_outboxemail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_question_id', models.BigIntegerField(default=0)),
+                ('question_count', models.PositiveIntegerField(default=0)),
+                ('recipient_count', models.PositiveIntegerField(default=0)),
+                ('sent_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
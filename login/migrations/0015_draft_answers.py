@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0014_notificationdigest'),
+    ]
+
+    operations = [
+        # Submissions created before drafts existed are all finished.
+        migrations.AddField(
+            model_name='quizsubmission',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('submitted', 'Submitted')], default='submitted', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='quizsubmission',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('submitted', 'Submitted')], default='draft', max_length=10),
+        ),
+        migrations.AddConstraint(
+            model_name='answer',
+            constraint=models.UniqueConstraint(fields=('submission', 'question'), name='unique_answer_per_question'),
+        ),
+    ]
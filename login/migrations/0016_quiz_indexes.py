@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:01
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_submissions(apps, schema_editor):
+    """Keep the latest submitted (else latest) submission per user and quiz."""
+    QuizSubmission = apps.get_model('login', 'QuizSubmission')
+    duplicates = (
+        QuizSubmission.objects.values('user_id', 'quiz_id')
+        .annotate(count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for row in duplicates.iterator():
+        submissions = QuizSubmission.objects.filter(
+            user_id=row['user_id'], quiz_id=row['quiz_id']
+        )
+        keep = (
+            submissions.filter(status='submitted').order_by('-id').first()
+            or submissions.order_by('-id').first()
+        )
+        submissions.exclude(pk=keep.pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0015_draft_answers'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            remove_duplicate_submissions, migrations.RunPython.noop
+        ),
+        migrations.AddIndex(
+            model_name='choice',
+            index=models.Index(fields=['question', 'is_correct'], name='choice_question_correct_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['created_at'], name='quiz_created_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['start_time'], name='quiz_start_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='quiz',
+            index=models.Index(fields=['end_time'], name='quiz_end_time_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='quizsubmission',
+            constraint=models.UniqueConstraint(fields=('user', 'quiz'), name='unique_submission_per_quiz'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+
+def create_stat_rows(apps, schema_editor):
+    """Create the counter rows grading used to create on the fly."""
+    Quiz = apps.get_model('login', 'Quiz')
+    Choice = apps.get_model('login', 'Choice')
+    QuestionStat = apps.get_model('login', 'QuestionStat')
+    ChoiceStat = apps.get_model('login', 'ChoiceStat')
+    QuestionStat.objects.bulk_create(
+        [
+            QuestionStat(quiz_id=quiz_id, question_id=question_id)
+            for quiz_id, question_id in Quiz.questions.through.objects.values_list(
+                'quiz_id', 'question_id'
+            )
+        ],
+        ignore_conflicts=True,
+    )
+    ChoiceStat.objects.bulk_create(
+        [
+            ChoiceStat(quiz_id=quiz_id, choice_id=choice_id)
+            for quiz_id, choice_id in Choice.objects.filter(
+                question__quizzes__isnull=False
+            ).values_list('question__quizzes', 'id')
+        ],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('login', '0016_quiz_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_stat_rows, migrations.RunPython.noop),
+    ]
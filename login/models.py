@@ -1,5 +1,6 @@
 from django.contrib.auth.models import User
 from django.db import models
+from django.utils import timezone
 
 
 class Question(models.Model):
@@ -15,6 +16,14 @@ class Choice(models.Model):
     text = models.CharField(max_length=255)
     is_correct = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["question", "is_correct"],
+                name="choice_question_correct_idx",
+            ),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -26,16 +35,39 @@ class Quiz(models.Model):
     questions = models.ManyToManyField(Question, related_name="quizzes")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="quiz_created_at_idx"),
+            models.Index(fields=["start_time"], name="quiz_start_time_idx"),
+            models.Index(fields=["end_time"], name="quiz_end_time_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
 class QuizSubmission(models.Model):
+    class Status(models.TextChoices):
+        DRAFT = "draft", "Draft"
+        SUBMITTED = "submitted", "Submitted"
+
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.DRAFT,
+    )
     started_at = models.DateTimeField(auto_now_add=True)
     completed_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "quiz"], name="unique_submission_per_quiz"
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user}'s submission for {self.quiz}"
 
@@ -50,5 +82,160 @@ class Answer(models.Model):
     answer_choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
     submitted_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["submission", "question"],
+                name="unique_answer_per_question",
+            ),
+        ]
+
     def __str__(self):
         return f"{self.question} - {self.answer_choice}"
+
+
+class QuizResult(models.Model):
+    submission = models.OneToOneField(
+        QuizSubmission,
+        on_delete=models.CASCADE,
+        related_name="result",
+    )
+    score = models.FloatField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    outcomes = models.JSONField(default=list)
+    graded_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Result for {self.submission}"
+
+
+class GradingJob(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        DONE = "done", "Done"
+        FAILED = "failed", "Failed"
+
+    submission = models.OneToOneField(
+        QuizSubmission,
+        on_delete=models.CASCADE,
+        related_name="grading_job",
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+        db_index=True,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Grading job for {self.submission} ({self.status})"
+
+
+class QuestionStat(models.Model):
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    attempts = models.PositiveIntegerField(default=0)
+    correct_count = models.PositiveIntegerField(default=0)
+    # Running sums of the respondents' scores, used for the discrimination
+    # index without rescanning the answers.
+    score_sum = models.FloatField(default=0)
+    score_sq_sum = models.FloatField(default=0)
+    correct_score_sum = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["quiz", "question"], name="unique_question_stat"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.question} in {self.quiz}"
+
+
+class ChoiceStat(models.Model):
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
+    choice = models.ForeignKey(Choice, on_delete=models.CASCADE)
+    picks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["quiz", "choice"], name="unique_choice_stat"
+            ),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.choice} in {self.quiz}"
+
+
+class OutboxEmail(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        SENT = "sent", "Sent"
+        DEAD = "dead", "Dead"
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(
+        max_length=10,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"],
+                name="outbox_due_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.recipients)}"
+
+
+class NotificationDigest(models.Model):
+    last_question_id = models.BigIntegerField(default=0)
+    question_count = models.PositiveIntegerField(default=0)
+    recipient_count = models.PositiveIntegerField(default=0)
+    sent_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Digest of {self.question_count} questions at {self.sent_at}"
+
+
+class Upload(models.Model):
+    """A stored file uploaded by a user, who alone may read it."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="uploads"
+    )
+    digest = models.CharField(max_length=64)
+    size = models.PositiveBigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "digest"], name="unique_user_upload"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.digest} uploaded by {self.user}"
@@ -1,39 +1,69 @@
-from django.core.mail import send_mail
-from django.db.models.signals import post_save
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 
-from .models import Question
+from .models import Choice, Question, Quiz
+from .utils.analytics import create_stat_rows
+from .utils.outbox import enqueue_email
+from .utils.quiz_cache import invalidate_quiz_snapshots
+from mysite.cache import bump_generation
 from mysite.settings import EMAIL_HOST_USER
 
+# Generation of the cached pages of the quiz list.
+QUIZ_LIST_NAMESPACE = "quiz-list"
 
-@receiver(post_save, sender=Question)
-def send_mail_on_new_question(sender, instance, created, **kwargs):
-    if created:
-        receiptent_list = [
-            user.email for user in User.objects.all() if user.email
-        ]
+# Set of quiz ids touched during the current bulk operation, if any.
+_bulk_operation = ContextVar("login_bulk_operation", default=None)
 
-        if not receiptent_list:
-            return
 
-        send_mail(
-            subject="New Question Created",
-            message="""
-                Welcome Candidate
-                A new question has been added.
-                Please login to answer it.
-            """,
-            from_email=EMAIL_HOST_USER,
-            recipient_list=receiptent_list,
-            fail_silently=False,
-        )
+@contextmanager
+def bulk_operation():
+    """
+    Suppress per-row signal side effects while loading many rows.
+
+    Notification emails are skipped and quiz snapshots and the quiz list
+    are invalidated once when the block exits instead of once per saved
+    row. New questions are still announced by the periodic
+    `send_question_digest` command.
+    """
+    if _bulk_operation.get() is not None:
+        yield
+        return
+
+    touched_quizzes = set()
+    token = _bulk_operation.set(touched_quizzes)
+    try:
+        yield
+    finally:
+        _bulk_operation.reset(token)
+        create_stat_rows(touched_quizzes)
+        invalidate_quiz_snapshots(touched_quizzes)
+        bump_generation(QUIZ_LIST_NAMESPACE)
+
+
+def _invalidate(quiz_ids):
+    touched_quizzes = _bulk_operation.get()
+    if touched_quizzes is None:
+        invalidate_quiz_snapshots(quiz_ids)
+    else:
+        touched_quizzes.update(quiz_ids)
 
 
 @receiver(post_save, sender=User)
 def send_mail_on_new_user(sender, instance, created, **kwargs):
+    if _bulk_operation.get() is not None:
+        return
     if created and instance.email:
-        send_mail(
+        enqueue_email(
             subject="Welcome to the Quiz App",
             message="""
                 Welcome Candidate,
@@ -42,5 +72,84 @@ def send_mail_on_new_user(sender, instance, created, **kwargs):
             """,
             from_email=EMAIL_HOST_USER,
             recipient_list=[instance.email],
-            fail_silently=False,
         )
+
+
+def _quiz_ids_for_question(question_id):
+    return Quiz.questions.through.objects.filter(
+        question_id=question_id
+    ).values_list("quiz_id", flat=True)
+
+
+@receiver(post_save, sender=Quiz)
+@receiver(post_delete, sender=Quiz)
+def invalidate_quiz_on_change(sender, instance, **kwargs):
+    _invalidate([instance.pk])
+    if _bulk_operation.get() is None:
+        bump_generation(QUIZ_LIST_NAMESPACE)
+
+
+@receiver(post_save, sender=Question)
+@receiver(pre_delete, sender=Question)
+def invalidate_quiz_on_question_change(sender, instance, **kwargs):
+    if not kwargs.get("created"):
+        _invalidate(_quiz_ids_for_question(instance.pk))
+
+
+@receiver(pre_save, sender=Choice)
+def remember_choice_question(sender, instance, **kwargs):
+    # A choice moved to another question leaves the quizzes of the old one.
+    instance._previous_question_id = None
+    if not instance._state.adding:
+        instance._previous_question_id = (
+            Choice.objects.filter(pk=instance.pk)
+            .values_list("question_id", flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def invalidate_quiz_on_choice_change(sender, instance, **kwargs):
+    question_ids = {instance.question_id}
+    previous = getattr(instance, "_previous_question_id", None)
+    if previous is not None:
+        question_ids.add(previous)
+    _invalidate(
+        Quiz.questions.through.objects.filter(
+            question_id__in=question_ids
+        ).values_list("quiz_id", flat=True)
+    )
+
+
+@receiver(m2m_changed, sender=Quiz.questions.through)
+def invalidate_quiz_on_questions_change(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            _invalidate([instance.pk])
+    elif action in ("post_add", "post_remove"):
+        _invalidate(pk_set)
+    elif action == "pre_clear":
+        _invalidate(_quiz_ids_for_question(instance.pk))
+
+
+def _create_stat_rows(quiz_ids):
+    # A bulk operation creates the rows of every touched quiz at its end.
+    if _bulk_operation.get() is None:
+        create_stat_rows(quiz_ids)
+
+
+@receiver(post_save, sender=Choice)
+def create_stat_rows_on_new_choice(sender, instance, created, **kwargs):
+    if created:
+        _create_stat_rows(_quiz_ids_for_question(instance.question_id))
+
+
+@receiver(m2m_changed, sender=Quiz.questions.through)
+def create_stat_rows_on_questions_add(
+    sender, instance, action, reverse, pk_set, **kwargs
+):
+    if action == "post_add":
+        _create_stat_rows(pk_set if reverse else [instance.pk])
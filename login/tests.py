@@ -1,9 +1,116 @@
+import asyncio
+import datetime
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import skipUnless
 from unittest.mock import patch
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.contrib.sessions.models import Session
+from django.core.exceptions import ValidationError
+from django.core import mail
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import (
+    OperationalError,
+    connection,
+    connections,
+    transaction,
+)
+from django.db.models import Count, Sum
+from django.http import StreamingHttpResponse
+from django.test import (
+    Client,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 
+from mysite.cache import get_or_build
+from mysite.db import PrimaryReplicaRouter, replica_reads, sqlite_pragmas
+from mysite.metrics import (
+    STOPPED_FILE,
+    ValueFile,
+    read_directory,
+    render,
+)
+from mysite.middleware import STICKY_COOKIE
+from mysite.profiling import RequestProfile, current_profile, server_timing
 from mysite.settings import EMAIL_HOST_USER
+from polls.models import Choice as PollChoice
+
+from .models import (
+    Answer,
+    Choice,
+    ChoiceStat,
+    GradingJob,
+    OutboxEmail,
+    Question,
+    Quiz,
+    QuizResult,
+    QuizSubmission,
+    QuestionStat,
+    Upload,
+)
+from .utils.analytics import record_result, rebuild_quiz_stats
+from .utils.benchmark import (
+    Scenarios,
+    baseline_metrics,
+    compare,
+    measure,
+    percentile,
+    seed_benchmark_data,
+)
+from .utils.file_utils import StoredFile
+from .utils.grading import (
+    claim_grading_jobs,
+    grade_submission,
+    requeue_failed_jobs,
+    run_grading_job,
+)
+from .signals import bulk_operation
+from .utils.notifications import send_question_digest
+from .utils.otp import (
+    OTPRateLimited,
+    consume_otp,
+    issue_otp,
+    match_otp,
+)
+from .utils.rate_limit import SlidingWindowLimiter, limiter_stats
+from .utils.outbox import deliver_outbox, enqueue_email
+from .utils.quiz_cache import get_quiz_snapshot
+from .utils.synthetic import generate_dataset
+from .utils.submissions import save_draft_answers, submit_draft
+
+
+def create_quiz(num_questions, num_choices=3, name="Quiz"):
+    """
+    Create a quiz with `num_questions` questions, each having `num_choices`
+    choices of which the first one is correct.
+    """
+    now = timezone.now()
+    quiz = Quiz.objects.create(
+        name=name,
+        start_time=now,
+        end_time=now + datetime.timedelta(hours=1),
+    )
+    for i in range(num_questions):
+        question = Question.objects.create(text=f"Question {i}")
+        for j in range(num_choices):
+            Choice.objects.create(
+                question=question, text=f"Choice {i}.{j}", is_correct=j == 0
+            )
+        quiz.questions.add(question)
+    return quiz
 
 
 class LoginTests(TestCase):
@@ -108,6 +215,7 @@ class DashboardTests(TestCase):
 
 class RegistrationTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.client = Client()
         self.username = "username"
         self.password = "password"
@@ -147,3 +255,1705 @@ class RegistrationTests(TestCase):
             response, "Registration successful. You can now log in."
         )
         self.assertTrue(User.objects.filter(username=self.username).exists())
+
+    @patch("login.utils.email_utils.generate_otp", return_value="123456")
+    def test_password_typo_keeps_the_otp(self, mock_generate_otp):
+        """
+        A registration rejected for mismatched passwords can be retried with
+        the same OTP, which is used up once registration succeeds.
+        """
+        self.client.post(reverse("login:register"), {"email": self.email})
+        data = {
+            "username": self.username,
+            "password": "secret-password",
+            "confirm_password": "secret-pasword",
+            "otp": "123456",
+        }
+        response = self.client.post(
+            reverse("login:register"), data, follow=True
+        )
+        self.assertContains(response, "Registration failed.")
+
+        data["confirm_password"] = "secret-password"
+        response = self.client.post(
+            reverse("login:register"), data, follow=True
+        )
+        self.assertRedirects(response, reverse("login:login"))
+        self.assertFalse(match_otp("register", self.email, "123456"))
+
+
+class QuizResultTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+
+    def submit(self, quiz, correct=True):
+        """Create a submission answering every question of `quiz`."""
+        submission = QuizSubmission.objects.create(
+            user=self.user,
+            quiz=quiz,
+            status=QuizSubmission.Status.SUBMITTED,
+        )
+        for question in quiz.questions.all():
+            choice = question.choice_set.filter(is_correct=correct).first()
+            Answer.objects.create(
+                submission=submission, question=question, answer_choice=choice
+            )
+        return submission
+
+    def test_grade_submission_stores_result(self):
+        """
+        grade_submission() stores the score, correct count and a review
+        entry per question, and marks the submission as completed.
+        """
+        quiz = create_quiz(4)
+        submission = self.submit(quiz)
+        wrong = submission.answers.first()
+        wrong.answer_choice = wrong.question.choice_set.get(
+            text__endswith=".1"
+        )
+        wrong.save()
+
+        result = grade_submission(submission)
+        self.assertEqual(result.total, 4)
+        self.assertEqual(result.correct_count, 3)
+        self.assertEqual(result.score, 75.0)
+        self.assertEqual(len(result.outcomes), 4)
+        submission.refresh_from_db()
+        self.assertIsNotNone(submission.completed_at)
+
+    def test_grade_submission_query_count_is_constant(self):
+        """
+        Grading runs the same number of queries for small and large quizzes.
+        """
+        small = self.submit(create_quiz(2, name="Small"))
+        large = self.submit(create_quiz(20, name="Large"))
+        with CaptureQueriesContext(connection) as small_queries:
+            grade_submission(small)
+        with CaptureQueriesContext(connection) as large_queries:
+            grade_submission(large)
+        self.assertEqual(len(small_queries), len(large_queries))
+
+    def test_result_page_reads_stored_result(self):
+        """
+        The result page is served from the stored result, independently of
+        the number of questions in the quiz.
+        """
+        quiz = create_quiz(10)
+        grade_submission(self.submit(quiz, correct=False))
+        self.client.force_login(self.user)
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse("login:result", args=(quiz.id,))
+            )
+        self.assertContains(response, "0/10")
+
+    def test_result_page_without_submission(self):
+        """
+        Users who have not taken the quiz are redirected to the dashboard.
+        """
+        quiz = create_quiz(1)
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("login:result", args=(quiz.id,)))
+        self.assertRedirects(response, reverse("login:dashboard"))
+
+
+class QuizSnapshotTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+
+    def test_snapshot_is_built_once(self):
+        """
+        The snapshot holds the questions in order with their choices, and
+        later lookups are served without touching the database.
+        """
+        quiz = create_quiz(3, num_choices=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            snapshot = get_quiz_snapshot(quiz.id)
+        self.assertEqual(
+            [q.text for q in snapshot.questions],
+            ["Question 0", "Question 1", "Question 2"],
+        )
+        self.assertEqual(len(snapshot.questions[0].choices), 2)
+        with self.assertNumQueries(0):
+            self.assertIs(get_quiz_snapshot(quiz.id), snapshot)
+
+    def test_snapshot_invalidated_by_choice_change(self):
+        """
+        Editing a choice starts a new snapshot version.
+        """
+        quiz = create_quiz(1)
+        snapshot = get_quiz_snapshot(quiz.id)
+        choice = Choice.objects.get(text="Choice 0.1")
+        choice.text = "Edited"
+        choice.save()
+        new_snapshot = get_quiz_snapshot(quiz.id)
+        self.assertNotEqual(new_snapshot.version, snapshot.version)
+        self.assertIn(
+            "Edited", [c.text for c in new_snapshot.questions[0].choices]
+        )
+
+    def test_moved_choice_leaves_the_old_quiz(self):
+        """
+        Moving a choice to a question of another quiz invalidates both
+        quizzes.
+        """
+        old_quiz = create_quiz(1, name="Old")
+        new_quiz = create_quiz(1, name="New")
+        with self.captureOnCommitCallbacks(execute=True):
+            old_snapshot = get_quiz_snapshot(old_quiz.id)
+            get_quiz_snapshot(new_quiz.id)
+        choice = old_quiz.questions.get().choice_set.last()
+        choice.question = new_quiz.questions.get()
+        choice.save()
+        self.assertNotEqual(
+            get_quiz_snapshot(old_quiz.id).version, old_snapshot.version
+        )
+        self.assertNotIn(choice.id, get_quiz_snapshot(old_quiz.id).choices)
+        self.assertIn(choice.id, get_quiz_snapshot(new_quiz.id).choices)
+
+    def test_snapshot_invalidated_by_question_membership(self):
+        """
+        Adding a question to a quiz from either side of the relation starts
+        a new snapshot version.
+        """
+        quiz = create_quiz(1)
+        get_quiz_snapshot(quiz.id)
+        question = Question.objects.create(text="Extra")
+        question.quizzes.add(quiz)
+        self.assertEqual(len(get_quiz_snapshot(quiz.id).questions), 2)
+
+    def test_page_turn_runs_no_quiz_queries(self):
+        """
+        Once the snapshot is built, rendering a page of questions does not
+        query quiz content.
+        """
+        quiz = create_quiz(4)
+        self.client.force_login(self.user)
+        url = reverse("login:questions", args=(quiz.id,))
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"page": 2})
+        self.assertContains(response, "Question 2")
+        content_tables = (
+            '"login_quiz"',
+            '"login_quiz_questions"',
+            '"login_question"',
+            '"login_choice"',
+        )
+        self.assertFalse(
+            [
+                q
+                for q in queries
+                if any(table in q["sql"] for table in content_tables)
+            ],
+        )
+
+    def test_unknown_quiz(self):
+        self.client.force_login(self.user)
+        response = self.client.get(reverse("login:questions", args=(999,)))
+        self.assertEqual(response.status_code, 404)
+
+
+def correct_choices(quiz):
+    """Return the correct choice id of every question of `quiz`."""
+    return dict(
+        Choice.objects.filter(
+            question__quizzes=quiz, is_correct=True
+        ).values_list("question_id", "id")
+    )
+
+
+def correct_answers(quiz):
+    """Return form data answering every question of `quiz` correctly."""
+    return {
+        f"question_{question_id}": str(choice_id)
+        for question_id, choice_id in correct_choices(quiz).items()
+    }
+
+
+def submit_answers(user, snapshot, answers):
+    """Save `answers` as the user's draft and submit it."""
+    draft = save_draft_answers(user, snapshot, answers)
+    submit_draft(draft, snapshot)
+    draft.refresh_from_db()
+    return draft
+
+
+class SubmissionIngestionTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+
+    def test_questions_submit_flow(self):
+        """
+        Answering every page of the quiz stores and grades the submission.
+        """
+        quiz = create_quiz(3)
+        answers = correct_answers(quiz)
+        fields = sorted(answers, key=lambda f: int(f.split("_")[1]))
+        url = reverse("login:questions", args=(quiz.id,))
+        self.client.force_login(self.user)
+        self.client.get(url)
+        self.client.post(
+            url, {"page": 2, **{f: answers[f] for f in fields[:2]}}
+        )
+        response = self.client.post(
+            url, {"submitted": "true", fields[2]: answers[fields[2]]}
+        )
+        self.assertRedirects(response, reverse("login:dashboard"))
+        submission = QuizSubmission.objects.get(user=self.user, quiz=quiz)
+        self.assertEqual(
+            submission.grading_job.status, GradingJob.Status.PENDING
+        )
+
+
+class GradingQueueTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+        self.quiz = create_quiz(2)
+        self.submission = submit_answers(
+            self.user,
+            get_quiz_snapshot(self.quiz.id),
+            correct_choices(self.quiz),
+        )
+
+    def test_worker_grades_queued_submissions(self):
+        """
+        The grading worker drains the queue, storing the result and marking
+        the submission as completed.
+        """
+        call_command(
+            "grade_submissions", once=True, workers=1, stdout=StringIO()
+        )
+        self.submission.refresh_from_db()
+        self.assertIsNotNone(self.submission.completed_at)
+        self.assertEqual(self.submission.result.correct_count, 2)
+        self.assertEqual(
+            self.submission.grading_job.status, GradingJob.Status.DONE
+        )
+
+    def test_claimed_jobs_are_not_claimed_twice(self):
+        self.assertEqual(len(claim_grading_jobs(10)), 1)
+        self.assertEqual(claim_grading_jobs(10), [])
+
+    def test_result_page_while_grading(self):
+        """
+        The result page tells the user to come back while grading is pending.
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("login:result", args=(self.quiz.id,)), follow=True
+        )
+        self.assertRedirects(response, reverse("login:dashboard"))
+        self.assertContains(response, "being graded")
+
+    def test_failed_jobs_retry_then_fail_until_requeued(self):
+        with patch(
+            "login.utils.grading.grade_submission",
+            side_effect=RuntimeError("boom"),
+        ):
+            for _ in range(3):
+                [job] = claim_grading_jobs(10, retry_after=0)
+                self.assertFalse(run_grading_job(job, max_attempts=3))
+        job.refresh_from_db()
+        self.assertEqual(job.status, GradingJob.Status.FAILED)
+        self.assertEqual(job.attempts, 3)
+        self.assertIn("boom", job.last_error)
+        self.assertEqual(claim_grading_jobs(10, retry_after=0), [])
+
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("login:result", args=(self.quiz.id,)), follow=True
+        )
+        self.assertContains(response, "could not be graded")
+        self.assertNotContains(response, "being graded")
+
+        self.assertEqual(requeue_failed_jobs(), 1)
+        [job] = claim_grading_jobs(10)
+        self.assertTrue(run_grading_job(job))
+
+    def test_failed_attempt_waits_before_retry(self):
+        [job] = claim_grading_jobs(10)
+        with patch(
+            "login.utils.grading.grade_submission",
+            side_effect=RuntimeError("boom"),
+        ):
+            run_grading_job(job)
+        self.assertEqual(claim_grading_jobs(10, retry_after=60), [])
+        self.assertEqual(len(claim_grading_jobs(10, retry_after=0)), 1)
+
+
+class QuizAnalyticsTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.quiz = create_quiz(2)
+        answers = correct_choices(self.quiz)
+        wrong = dict(answers)
+        first = min(wrong)
+        wrong[first] = Choice.objects.get(
+            question_id=first, text__endswith=".1"
+        ).id
+        snapshot = get_quiz_snapshot(self.quiz.id)
+        for i, data in enumerate([answers, answers, wrong]):
+            user = User.objects.create_user(username=f"user{i}")
+            grade_submission(submit_answers(user, snapshot, data))
+
+    def counters(self):
+        return (
+            list(
+                QuestionStat.objects.order_by("question_id").values_list(
+                    "attempts", "correct_count", "score_sum", "score_sq_sum"
+                )
+            ),
+            list(
+                ChoiceStat.objects.order_by("choice_id").values_list(
+                    "choice_id", "picks"
+                )
+            ),
+        )
+
+    def test_counters_updated_on_grading(self):
+        """
+        Grading a submission bumps the question and choice counters.
+        """
+        question_stats, choice_stats = self.counters()
+        self.assertEqual([s[:2] for s in question_stats], [(3, 2), (3, 3)])
+        self.assertEqual(sum(picks for _, picks in choice_stats), 6)
+
+    def test_stat_rows_are_created_with_the_quiz(self):
+        """
+        Counter rows exist before any grading, so grading only updates.
+        """
+        quiz = create_quiz(2, num_choices=4)
+        self.assertEqual(QuestionStat.objects.filter(quiz=quiz).count(), 2)
+        self.assertEqual(ChoiceStat.objects.filter(quiz=quiz).count(), 8)
+
+        snapshot = get_quiz_snapshot(quiz.id)
+        question = snapshot.questions[0]
+        outcomes = [
+            {
+                "question_id": question.id,
+                "selected_choice_id": question.correct_choice.id,
+                "is_correct": True,
+            }
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            record_result(snapshot, outcomes, 100)
+        statements = [query["sql"].split()[0] for query in queries]
+        self.assertNotIn("INSERT", statements)
+        self.assertEqual(
+            QuestionStat.objects.get(
+                quiz=quiz, question_id=question.id
+            ).attempts,
+            1,
+        )
+
+    def test_rebuild_matches_incremental_counters(self):
+        """
+        Rebuilding from the stored results gives the incremental counters.
+        """
+        expected = self.counters()
+        QuestionStat.objects.all().delete()
+        rebuild_quiz_stats(get_quiz_snapshot(self.quiz.id), chunk_size=1)
+        self.assertEqual(self.counters(), expected)
+
+    def test_analytics_page(self):
+        """
+        Staff members see the item analysis, other users are redirected.
+        """
+        url = reverse("login:analytics", args=(self.quiz.id,))
+        self.client.force_login(User.objects.get(username="user0"))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        staff = User.objects.create_user(username="staff", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(url)
+        self.assertContains(response, "Discrimination index")
+        self.assertEqual(response.context["questions"][0]["attempts"], 3)
+        self.assertIsNotNone(
+            response.context["questions"][0]["discrimination"]
+        )
+
+
+class ImportQuestionsTests(TestCase):
+    def setUp(self):
+        self.quiz = create_quiz(0, name="Imported")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, name, content):
+        path = Path(self.tmp.name) / name
+        path.write_text(content, encoding="utf-8")
+        return str(path)
+
+    def test_import_csv(self):
+        """
+        CSV rows are grouped into questions, stored with their choices and
+        added to the named quizzes without sending notification emails.
+        """
+        path = self.write(
+            "bank.csv",
+            "question,choice,is_correct,quizzes\n"
+            "2 + 2?,4,true,Imported\n"
+            "2 + 2?,5,false,Imported\n"
+            "Capital of France?,Paris,1,\n"
+            "Capital of France?,Rome,0,\n",
+        )
+        call_command("import_questions", path, chunk_size=1, stdout=StringIO())
+        self.assertEqual(Question.objects.count(), 2)
+        self.assertEqual(Choice.objects.filter(is_correct=True).count(), 2)
+        self.assertEqual(
+            [q.text for q in get_quiz_snapshot(self.quiz.id).questions],
+            ["2 + 2?"],
+        )
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_import_jsonl_dry_run(self):
+        """
+        A dry run validates the file without writing anything.
+        """
+        path = self.write(
+            "bank.jsonl",
+            json.dumps(
+                {
+                    "text": "Pick one",
+                    "choices": [
+                        {"text": "A", "is_correct": True},
+                        {"text": "B"},
+                    ],
+                    "quizzes": ["Imported"],
+                }
+            )
+            + "\n",
+        )
+        out = StringIO()
+        call_command("import_questions", path, dry_run=True, stdout=out)
+        self.assertIn("Validated 1 questions", out.getvalue())
+        self.assertFalse(Question.objects.exists())
+
+    def test_import_rejects_unknown_quiz(self):
+        path = self.write(
+            "bank.csv",
+            "question,choice,is_correct,quizzes\n"
+            "Q,A,true,Missing\n"
+            "Q,B,false,Missing\n",
+        )
+        with self.assertRaisesMessage(CommandError, "unknown quiz Missing"):
+            call_command("import_questions", path)
+
+    def test_import_rejects_jsonl_of_the_wrong_type(self):
+        valid = {
+            "text": "Pick one",
+            "choices": [{"text": "A", "is_correct": True}, {"text": "B"}],
+        }
+        for line, message in (
+            ([1, 2], "the question must be an object"),
+            ({**valid, "choices": ["A", "B"]}, "a choice must be an object"),
+            (
+                {**valid, "choices": [{"text": "A", "is_correct": "false"}]},
+                "is_correct must be true or false",
+            ),
+            ({**valid, "quizzes": "Imported"}, "quizzes must be a list"),
+        ):
+            path = self.write("bank.jsonl", "\n" + json.dumps(line) + "\n")
+            with self.assertRaisesMessage(CommandError, f"Line 2: {message}"):
+                call_command("import_questions", path)
+
+
+class ExportSubmissionsTests(TestCase):
+    def setUp(self):
+        self.client = Client()
+        self.quiz = create_quiz(2)
+        self.user = User.objects.create_user(username="candidate")
+        submit_answers(
+            self.user,
+            get_quiz_snapshot(self.quiz.id),
+            correct_choices(self.quiz),
+        )
+
+    def test_export_view_streams_csv(self):
+        staff = User.objects.create_user(username="staff", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(
+            reverse("login:export_submissions", args=(self.quiz.id,))
+        )
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[0].split(",")[:2], ["submission_id", "username"]
+        )
+        self.assertEqual(len(lines), 3)
+        self.assertIn("candidate", lines[1])
+
+    def test_export_view_requires_staff(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("login:export_submissions", args=(self.quiz.id,))
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_export_command_jsonl(self):
+        out = StringIO()
+        call_command(
+            "export_submissions", self.quiz.id, format="jsonl", stdout=out
+        )
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertTrue(all(row["is_correct"] for row in rows))
+
+
+class FailingConnection:
+    """Mail connection whose sends always fail."""
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        raise ConnectionError("SMTP server unavailable")
+
+
+class UnreachableConnection(FailingConnection):
+    """Mail connection that cannot connect to the server."""
+
+    def open(self):
+        raise ConnectionRefusedError("Connection refused")
+
+
+class OutboxTests(TestCase):
+    def test_registration_email_is_queued(self):
+        """
+        Requesting a registration OTP queues the email instead of sending it
+        during the request.
+        """
+        self.client.post(reverse("login:register"), {"email": "a@b.com"})
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertTrue(
+            OutboxEmail.objects.filter(recipients=["a@b.com"]).exists()
+        )
+
+    def test_worker_sends_queued_emails(self):
+        for i in range(3):
+            enqueue_email("Subject", "Body", [f"user{i}@example.com"])
+        call_command("send_outbox", once=True, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertFalse(
+            OutboxEmail.objects.exclude(
+                status=OutboxEmail.Status.SENT
+            ).exists()
+        )
+
+    def test_failed_email_is_retried_then_dead_lettered(self):
+        """
+        A failing message is rescheduled with backoff and dead-lettered once
+        it runs out of attempts.
+        """
+        email = enqueue_email("Subject", "Body", ["user@example.com"])
+        self.assertEqual(
+            deliver_outbox(max_attempts=2, connection=FailingConnection()),
+            (0, 1),
+        )
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.Status.PENDING)
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(deliver_outbox(max_attempts=2), (0, 0))
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        deliver_outbox(max_attempts=2, connection=FailingConnection())
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.Status.DEAD)
+        self.assertIn("SMTP server unavailable", email.last_error)
+
+    def test_unreachable_server_counts_as_failed_attempt(self):
+        """
+        When the connection cannot be opened, every claimed message uses up
+        an attempt and is rescheduled, then dead-lettered.
+        """
+        emails = [
+            enqueue_email("Subject", "Body", [f"user{i}@example.com"])
+            for i in range(2)
+        ]
+        self.assertEqual(
+            deliver_outbox(max_attempts=2, connection=UnreachableConnection()),
+            (0, 2),
+        )
+        for email in emails:
+            email.refresh_from_db()
+            self.assertEqual(email.status, OutboxEmail.Status.PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertIn("Connection refused", email.last_error)
+            self.assertGreater(email.next_attempt_at, timezone.now())
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        deliver_outbox(max_attempts=2, connection=UnreachableConnection())
+        self.assertEqual(
+            OutboxEmail.objects.filter(status=OutboxEmail.Status.DEAD).count(),
+            2,
+        )
+
+    def test_worker_survives_failed_batch(self):
+        enqueue_email("Subject", "Body", ["user@example.com"])
+        with patch(
+            "login.management.commands.send_outbox.deliver_outbox",
+            side_effect=[
+                RuntimeError("database is locked"),
+                (1, 0),
+                KeyboardInterrupt,
+            ],
+        ), patch("login.management.commands.send_outbox.time.sleep"):
+            with self.assertLogs(
+                "login.management.commands.send_outbox", "ERROR"
+            ):
+                out = StringIO()
+                call_command("send_outbox", stdout=out)
+        self.assertIn("Sent 1 emails", out.getvalue())
+
+
+class QuestionDigestTests(TestCase):
+    def setUp(self):
+        for i in range(3):
+            User.objects.create_user(
+                username=f"user{i}", email=f"user{i}@example.com"
+            )
+        User.objects.create_user(username="no-email")
+        OutboxEmail.objects.all().delete()
+
+    def test_new_questions_are_coalesced(self):
+        """
+        Creating questions queues nothing; the digest then queues one email
+        per user covering every new question.
+        """
+        for i in range(5):
+            Question.objects.create(text=f"Question {i}")
+        self.assertFalse(OutboxEmail.objects.exists())
+
+        self.assertEqual(send_question_digest(chunk_size=2), (5, 3))
+        emails = OutboxEmail.objects.all()
+        self.assertEqual(len(emails), 3)
+        self.assertTrue(all(len(email.recipients) == 1 for email in emails))
+        self.assertIn("5 new questions", emails[0].body)
+
+        self.assertEqual(send_question_digest(), (0, 0))
+        Question.objects.create(text="Later question")
+        self.assertEqual(send_question_digest(), (1, 3))
+
+    def test_bulk_operation_suppresses_welcome_emails(self):
+        with bulk_operation():
+            User.objects.create_user(username="bulk", email="bulk@example.com")
+        self.assertFalse(OutboxEmail.objects.exists())
+
+    def test_bulk_operation_invalidates_quiz_once(self):
+        """
+        Quiz snapshots are still invalidated when the bulk operation ends.
+        """
+        quiz = create_quiz(1)
+        version = get_quiz_snapshot(quiz.id).version
+        with bulk_operation():
+            quiz.questions.add(Question.objects.create(text="Bulk"))
+            self.assertEqual(get_quiz_snapshot(quiz.id).version, version)
+        self.assertEqual(len(get_quiz_snapshot(quiz.id).questions), 2)
+
+
+class OTPTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_otp_is_single_use(self):
+        issue_otp("register", "a@b.com", "10.0.0.1", "123456")
+        self.assertFalse(match_otp("register", "a@b.com", "654321"))
+        self.assertFalse(match_otp("reset", "a@b.com", "123456"))
+        self.assertTrue(match_otp("register", "a@b.com", "123456"))
+        self.assertTrue(consume_otp("register", "a@b.com"))
+        self.assertFalse(match_otp("register", "a@b.com", "123456"))
+
+    @override_settings(OTP_MAX_ATTEMPTS=2)
+    def test_otp_dropped_after_wrong_guesses(self):
+        issue_otp("register", "a@b.com", "10.0.0.1", "123456")
+        self.assertFalse(match_otp("register", "a@b.com", "000000"))
+        self.assertFalse(match_otp("register", "a@b.com", "111111"))
+        self.assertFalse(match_otp("register", "a@b.com", "123456"))
+
+    def test_matching_otp_is_not_used_up_until_consumed(self):
+        issue_otp("reset", "a@b.com", "10.0.0.1", "123456")
+        self.assertTrue(match_otp("reset", "a@b.com", "123456"))
+        self.assertTrue(match_otp("reset", "a@b.com", "123456"))
+        self.assertTrue(consume_otp("reset", "a@b.com"))
+        self.assertFalse(consume_otp("reset", "a@b.com"))
+        self.assertFalse(match_otp("reset", "a@b.com", "123456"))
+
+    def test_otp_requests_are_rate_limited_per_email(self):
+        for i in range(3):
+            issue_otp("register", "a@b.com", f"10.0.0.{i}", "123456")
+        with self.assertRaises(OTPRateLimited):
+            issue_otp("register", "a@b.com", "10.0.0.9", "123456")
+        issue_otp("register", "other@b.com", "10.0.0.9", "123456")
+
+    def test_otp_requests_are_rate_limited_per_client(self):
+        """
+        One client cannot trigger unlimited OTP emails, and the OTP is not
+        kept in the session.
+        """
+        for i in range(10):
+            client = Client()
+            client.post(reverse("login:register"), {"email": f"u{i}@b.com"})
+        self.assertNotIn("otp", client.session)
+        response = Client().post(
+            reverse("login:register"), {"email": "last@b.com"}, follow=True
+        )
+        self.assertContains(response, "Too many OTP requests")
+        self.assertFalse(
+            OutboxEmail.objects.filter(recipients=["last@b.com"]).exists()
+        )
+
+
+class LoginThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+
+    def test_sliding_window(self):
+        limiter = SlidingWindowLimiter("test", limit=2, window=60)
+        limiter.hit("key", now=0)
+        limiter.hit("key", now=1)
+        self.assertTrue(limiter.is_limited("key", now=2))
+        # Hits of the previous window fade out as the window slides on.
+        self.assertTrue(limiter.is_limited("key", now=60))
+        self.assertFalse(limiter.is_limited("key", now=90))
+
+    def test_local_fallback_when_cache_fails(self):
+        limiter = SlidingWindowLimiter("test", limit=1, window=60)
+        with patch.object(cache, "incr", side_effect=ConnectionError):
+            limiter.hit("key")
+        with patch.object(cache, "get_many", side_effect=ConnectionError):
+            self.assertTrue(limiter.is_limited("key"))
+        self.assertGreater(limiter_stats["cache_fallback"], 0)
+
+    @patch("login.views.auth_views.authenticate", return_value=None)
+    def test_throttled_login_skips_authenticate(self, mock_authenticate):
+        """
+        After too many failures for a username, further attempts are refused
+        without hashing the password.
+        """
+        for _ in range(5):
+            self.client.post(
+                reverse("login:login"),
+                {"username": "testuser", "password": "wrong"},
+            )
+        self.assertEqual(mock_authenticate.call_count, 5)
+        response = self.client.post(
+            reverse("login:login"),
+            {"username": "testuser", "password": "testpassword"},
+            follow=True,
+        )
+        self.assertContains(response, "Too many login attempts")
+        self.assertEqual(mock_authenticate.call_count, 5)
+
+
+class LowWriteSessionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+        self.client.force_login(self.user)
+
+    def test_quiz_pages_do_not_write_the_session(self):
+        """
+        Turning quiz pages keeps answers out of the session table, and
+        answers from earlier pages are shown again when going back.
+        """
+        quiz = create_quiz(4)
+        answers = correct_answers(quiz)
+        first_page = dict(sorted(answers.items())[:2])
+        url = reverse("login:questions", args=(quiz.id,))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+            self.client.post(url, {"page": 2, **first_page})
+        self.assertFalse(
+            [
+                q
+                for q in queries
+                if "django_session" in q["sql"]
+                and not q["sql"].startswith("SELECT")
+            ]
+        )
+        response = self.client.get(url, {"page": 1})
+        form = response.context["form"]
+        for field, choice_id in first_page.items():
+            self.assertEqual(str(form[field].initial), choice_id)
+
+    def test_clear_expired_sessions(self):
+        for i in range(5):
+            Session.objects.create(
+                session_key=f"expired{i}",
+                session_data="",
+                expire_date=timezone.now() - datetime.timedelta(days=1),
+            )
+        call_command(
+            "clear_expired_sessions", batch_size=2, pause=0, stdout=StringIO()
+        )
+        self.assertFalse(
+            Session.objects.filter(session_key__startswith="expired").exists()
+        )
+        self.assertTrue(Session.objects.exists())
+
+
+class DraftAnswerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+        self.quiz = create_quiz(4)
+        self.snapshot = get_quiz_snapshot(self.quiz.id)
+        self.answers = correct_choices(self.quiz)
+
+    def test_page_answers_are_upserted(self):
+        """
+        Saving a page twice updates the draft answers instead of adding rows.
+        """
+        question_id = min(self.answers)
+        wrong_choice = Choice.objects.get(
+            question_id=question_id, text__endswith=".1"
+        )
+        save_draft_answers(
+            self.user, self.snapshot, {question_id: wrong_choice.id}
+        )
+        draft = save_draft_answers(
+            self.user, self.snapshot, {question_id: self.answers[question_id]}
+        )
+        self.assertEqual(draft.status, QuizSubmission.Status.DRAFT)
+        self.assertEqual(
+            list(draft.answers.values_list("answer_choice_id", flat=True)),
+            [self.answers[question_id]],
+        )
+
+    def test_submit_flips_status_and_queues_grading(self):
+        draft = save_draft_answers(self.user, self.snapshot, self.answers)
+        submit_draft(draft, self.snapshot)
+        draft.refresh_from_db()
+        self.assertEqual(draft.status, QuizSubmission.Status.SUBMITTED)
+        self.assertTrue(GradingJob.objects.filter(submission=draft).exists())
+        with self.assertRaises(ValidationError):
+            save_draft_answers(self.user, self.snapshot, self.answers)
+
+    def test_incomplete_draft_cannot_be_submitted(self):
+        answers = dict(self.answers)
+        answers.popitem()
+        draft = save_draft_answers(self.user, self.snapshot, answers)
+        with self.assertRaises(ValidationError):
+            submit_draft(draft, self.snapshot)
+
+    def test_choice_of_another_question_is_rejected(self):
+        first, second = sorted(self.answers)[:2]
+        with self.assertRaises(ValidationError):
+            save_draft_answers(
+                self.user, self.snapshot, {first: self.answers[second]}
+            )
+
+    def test_resume_in_a_new_session(self):
+        """
+        Answers saved from one session are shown again after logging in
+        from a new one.
+        """
+        first_page = dict(sorted(self.answers.items())[:2])
+        save_draft_answers(self.user, self.snapshot, first_page)
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse("login:questions", args=(self.quiz.id,)))
+        form = response.context["form"]
+        for question_id, choice_id in first_page.items():
+            self.assertEqual(
+                form[f"question_{question_id}"].initial, choice_id
+            )
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        cache.stats.clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+        self.client.force_login(self.user)
+
+    def test_shared_value_is_kept_locally_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            cache.set("key", {"value": 1})
+        self.assertEqual(cache.get("key"), {"value": 1})
+        self.assertEqual(cache.stats["l1_hits"], 1)
+
+        # A write evicts the local copy before reaching the shared backend.
+        cache.set("key", {"value": 2})
+        self.assertEqual(cache.get("key"), {"value": 2})
+        self.assertEqual(cache.stats["l2_hits"], 1)
+
+    def test_rolled_back_value_is_not_kept_locally(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            cache.set("key", "value")
+        cache.shared.delete("key")
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats["misses"], 1)
+
+    def test_single_flight_rebuild(self):
+        shared = LocMemCache("single-flight", {})
+        calls = []
+
+        def build():
+            calls.append(1)
+            time.sleep(0.1)
+            return "value"
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(
+                    get_or_build("key", build, cache=shared)
+                )
+            )
+            for _ in range(20)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["value"] * 20)
+        self.assertEqual(len(calls), 1)
+
+    def test_quiz_list_is_cached_and_invalidated(self):
+        create_quiz(1, name="First quiz")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(reverse("login:quiz_list"))
+        # Only the session and the user are loaded.
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse("login:quiz_list"))
+        self.assertContains(response, "First quiz")
+
+        create_quiz(1, name="Second quiz")
+        response = self.client.get(reverse("login:quiz_list"))
+        self.assertContains(response, "Second quiz")
+
+    def test_quiz_list_is_paginated(self):
+        for i in range(25):
+            Quiz.objects.create(
+                name=f"Quiz {i}",
+                start_time=timezone.now(),
+                end_time=timezone.now(),
+            )
+        response = self.client.get(reverse("login:quiz_list"), {"page": 2})
+        self.assertEqual(len(response.context["quizzes"]), 5)
+        self.assertContains(response, "Page 2 of 2")
+
+
+@skipUnless(connection.vendor == "sqlite", "Checks SQLite query plans.")
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+        self.quiz = create_quiz(1)
+        self.question = self.quiz.questions.get()
+        self.submission = QuizSubmission.objects.create(
+            user=self.user, quiz=self.quiz
+        )
+
+    def assertUsesIndex(self, queryset, index):
+        """
+        Assert the query searches an index. `index` is its name, or the
+        searched columns for unique constraints SQLite keeps inline.
+        """
+        plan = queryset.explain()
+        self.assertIn("USING", plan)
+        self.assertIn(index, plan)
+
+    def test_submission_lookup(self):
+        self.assertUsesIndex(
+            QuizSubmission.objects.filter(user=self.user, quiz=self.quiz),
+            "(user_id=? AND quiz_id=?)",
+        )
+
+    def test_answer_lookup(self):
+        self.assertUsesIndex(
+            self.submission.answers.filter(question=self.question),
+            "(submission_id=? AND question_id=?)",
+        )
+
+    def test_quiz_ordering_and_schedule(self):
+        now = timezone.now()
+        self.assertUsesIndex(
+            Quiz.objects.order_by("-created_at"), "quiz_created_at_idx"
+        )
+        self.assertUsesIndex(
+            Quiz.objects.filter(start_time__gt=now), "quiz_start_time_idx"
+        )
+        self.assertUsesIndex(
+            Quiz.objects.filter(end_time__lt=now), "quiz_end_time_idx"
+        )
+
+    def test_correct_choice_lookup(self):
+        # The correct choices are read from the index alone.
+        self.assertUsesIndex(
+            Choice.objects.filter(
+                question__in=[self.question], is_correct=True
+            ).values_list("question_id", "id"),
+            "COVERING INDEX choice_question_correct_idx",
+        )
+
+
+@skipUnless(connection.vendor == "sqlite", "Checks SQLite settings.")
+class SQLiteTuningTests(TestCase):
+    def test_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA temp_store")
+            # 2 is MEMORY.
+            self.assertEqual(cursor.fetchone()[0], 2)
+
+    def test_invalid_pragma_values_are_rejected(self):
+        with self.assertRaises(ValueError):
+            sqlite_pragmas({"journal_mode": "WAL; DROP TABLE login_quiz"})
+        with self.assertRaises(ValueError):
+            sqlite_pragmas({"foreign_keys": "OFF"})
+
+    def test_benchmark_reads_during_writes(self):
+        out = StringIO()
+        call_command(
+            "benchmark_sqlite",
+            journal_modes=["WAL"],
+            duration=0.2,
+            readers=1,
+            stdout=out,
+        )
+        row = out.getvalue().splitlines()[1].split()
+        self.assertEqual(row[0], "WAL")
+        self.assertGreater(int(row[1]), 0)
+        self.assertEqual(int(row[2]), 0)
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+        self.client.force_login(self.user)
+        self.quiz = create_quiz(2)
+        self.url = reverse("login:questions", args=(self.quiz.id,))
+
+    def queried_tables(self, queries, table):
+        return [q for q in queries if f'"{table}"' in q["sql"]]
+
+    def test_reads_go_to_the_replica(self):
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            self.client.get(self.url)
+        self.assertTrue(self.queried_tables(queries, "login_quizsubmission"))
+        # Sessions are always read from the primary.
+        self.assertFalse(self.queried_tables(queries, "django_session"))
+
+    def test_reads_after_a_write_go_to_the_primary(self):
+        response = self.client.post(self.url, correct_answers(self.quiz))
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        with CaptureQueriesContext(connections["replica"]) as queries:
+            self.client.get(self.url)
+        self.assertFalse(queries.captured_queries)
+
+    def test_reads_in_a_transaction_go_to_the_primary(self):
+        router = PrimaryReplicaRouter()
+        token = replica_reads.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Quiz), "replica")
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Quiz), "default")
+            router.db_for_write(Quiz)
+            self.assertEqual(router.db_for_read(Quiz), "default")
+        finally:
+            replica_reads.reset(token)
+
+    def test_commands_read_from_the_primary(self):
+        self.assertEqual(PrimaryReplicaRouter().db_for_read(Quiz), "default")
+
+
+class SeparateReplicaTests(TransactionTestCase):
+    """
+    Routing checked against a replica that is a copy of the primary taken
+    in `setUp`, instead of the test mirror that shares its data.
+    """
+
+    databases = {"default", "replica"}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+        self.quiz = create_quiz(4)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = str(Path(directory.name) / "replica.sqlite3")
+        primary = connections["default"]
+        primary.ensure_connection()
+        copy = sqlite3.connect(path)
+        primary.connection.backup(copy)
+        copy.close()
+
+        replica = connections["replica"]
+        # A test mirror shares the settings dict of the primary. Closing
+        # is ignored for in-memory databases, so the name goes first.
+        mirrored = replica.settings_dict
+        replica.settings_dict = {**mirrored, "NAME": path}
+        replica.close()
+
+        def restore():
+            replica.close()
+            replica.settings_dict = mirrored
+
+        self.addCleanup(restore)
+
+    def test_reads_are_served_by_the_replica(self):
+        Quiz.objects.filter(pk=self.quiz.pk).update(name="Renamed")
+        token = replica_reads.set(True)
+        try:
+            self.assertEqual(Quiz.objects.get(pk=self.quiz.pk).name, "Quiz")
+        finally:
+            replica_reads.reset(token)
+        self.assertEqual(Quiz.objects.get(pk=self.quiz.pk).name, "Renamed")
+
+    def test_writes_and_later_reads_use_the_primary(self):
+        self.client.force_login(self.user)
+        url = reverse("login:questions", args=(self.quiz.id,))
+        first_page = dict(sorted(correct_choices(self.quiz).items())[:2])
+        self.client.post(
+            url,
+            {
+                "page": 2,
+                **{f"question_{q}": c for q, c in first_page.items()},
+            },
+        )
+        submissions = QuizSubmission.objects.filter(user=self.user)
+        self.assertTrue(submissions.using("default").exists())
+        self.assertFalse(submissions.using("replica").exists())
+
+        # The draft is only on the primary, so it is shown only if the
+        # request after the write reads from there.
+        form = self.client.get(url).context["form"]
+        for question_id, choice_id in first_page.items():
+            self.assertEqual(
+                form[f"question_{question_id}"].initial, choice_id
+            )
+
+
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+        self.quiz = create_quiz(1, name="Async quiz")
+
+    async def test_read_views_under_asgi(self):
+        await self.async_client.aforce_login(self.user)
+        pages = {
+            "login:dashboard": "testuser",
+            "login:profile": "testuser",
+            "login:quiz_list": "Async quiz",
+        }
+        for name, text in pages.items():
+            response = await self.async_client.get(reverse(name))
+            self.assertContains(response, text)
+
+    async def test_concurrent_quiz_list_requests(self):
+        await self.async_client.aforce_login(self.user)
+        responses = await asyncio.gather(
+            *(
+                self.async_client.get(reverse("login:quiz_list"))
+                for _ in range(10)
+            )
+        )
+        for response in responses:
+            self.assertContains(response, "Async quiz")
+
+    async def test_result_without_submission_redirects(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(
+            reverse("login:result", args=(self.quiz.id,))
+        )
+        self.assertRedirects(
+            response, reverse("login:dashboard"), fetch_redirect_response=False
+        )
+
+
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+        create_quiz(1, name="Profiled quiz")
+        self.client.force_login(self.user)
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1)
+    def test_sampled_request_reports_timings(self):
+        with self.assertLogs("mysite.profiling", "INFO") as logs:
+            response = self.client.get(reverse("login:quiz_list"))
+
+        timing = response["Server-Timing"]
+        for metric in ("db;dur=", "tpl;dur=", "view;dur=", "total;dur="):
+            self.assertIn(metric, timing)
+        record = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(record["view"], "login:quiz_list")
+        self.assertEqual(record["status"], 200)
+        self.assertGreater(record["queries"], 0)
+        self.assertIn(f'desc="{record["queries"]} queries"', timing)
+        self.assertEqual(record["templates"], ["login/quiz_list.html"])
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1)
+    async def test_async_request_is_profiled(self):
+        await self.async_client.aforce_login(self.user)
+        with self.assertLogs("mysite.profiling", "INFO"):
+            response = await self.async_client.get(reverse("login:quiz_list"))
+        self.assertIn("db;dur=", response["Server-Timing"])
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0)
+    def test_unsampled_request_is_not_profiled(self):
+        response = self.client.get(reverse("login:quiz_list"))
+        self.assertNotIn("Server-Timing", response)
+
+    def test_repeated_queries_are_reported(self):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            for _ in range(5):
+                list(Quiz.objects.filter(id=1))
+            Quiz.objects.count()
+        finally:
+            current_profile.reset(token)
+
+        self.assertEqual(profile.query_count, 6)
+        [(sql, count)] = profile.repeated(5)
+        self.assertEqual(count, 5)
+        self.assertIn("login_quiz", sql)
+        timing = server_timing(profile.timings(), 6, profile.repeated(5))
+        self.assertIn('repeated;desc="statements: 1, most runs: 5"', timing)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        overrides = override_settings(
+            METRICS_DIR=directory.name, METRICS_TOKEN="secret"
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = User.objects.create_user(
+            username="testuser", password="testpassword"
+        )
+        self.client.force_login(self.user)
+
+    def scrape(self):
+        return self.client.get(
+            reverse("metrics"), HTTP_AUTHORIZATION="Bearer secret"
+        )
+
+    def test_requests_are_recorded_by_url_name(self):
+        create_quiz(1, name="Measured quiz")
+        enqueue_email("Subject", "Body", ["a@example.com"])
+        for _ in range(2):
+            self.client.get(reverse("login:quiz_list"))
+
+        response = self.scrape()
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        body = response.content.decode()
+        for line in (
+            "# TYPE django_http_request_duration_seconds histogram",
+            'django_http_requests_total{view="login:quiz_list",method="GET",'
+            'status="200"} 2',
+            'django_http_request_duration_seconds_bucket{view="login:quiz_list"'
+            ',le="+Inf"} 2',
+            'django_db_queries_per_request_count{view="login:quiz_list"} 2',
+            'outbox_emails{status="pending"} 1',
+            'outbox_emails{status="dead"} 0',
+            'cache_hit_ratio{tier="any"}',
+        ):
+            self.assertIn(line, body)
+
+    def test_histogram_buckets_are_cumulative(self):
+        self.client.get("/no-such-page/")
+        body = render(self.directory)
+        buckets = [
+            int(line.rsplit(" ", 1)[1])
+            for line in body.splitlines()
+            if line.startswith(
+                'django_http_request_duration_seconds_bucket{view="unmatched"'
+            )
+        ]
+        self.assertEqual(len(buckets), 12)
+        self.assertEqual(buckets, sorted(buckets))
+        self.assertEqual(buckets[-1], 1)
+
+    def test_values_of_all_processes_are_added_up(self):
+        key = '["django_http_requests_total", [["view", "polls:vote"]]]'
+        ValueFile(self.directory / "1.db").inc(key, 2)
+        second = ValueFile(self.directory / "2.db")
+        second.inc(key, 3)
+        # Enough keys to grow the file past its initial size.
+        for number in range(3000):
+            second.set(f'["filler", [["n", "{number}"]]]', number)
+
+        totals = read_directory(self.directory)
+        self.assertEqual(totals[key], 5)
+        self.assertEqual(totals['["filler", [["n", "2999"]]]'], 2999)
+        # Reopening a file keeps its values.
+        ValueFile(self.directory / "1.db").inc(key)
+        self.assertEqual(read_directory(self.directory)[key], 6)
+
+    def test_files_of_stopped_processes_are_folded(self):
+        key = '["django_http_requests_total", [["view", "polls:vote"]]]'
+        stopped = self.directory / "999999999.db"
+        ValueFile(stopped).inc(key, 2)
+        ValueFile(self.directory / STOPPED_FILE).inc(key, 3)
+        line = 'django_http_requests_total{view="polls:vote"} 5'
+        self.assertIn(line, render(self.directory))
+        self.assertFalse(stopped.exists())
+        self.assertIn(line, render(self.directory))
+        self.assertEqual(
+            sorted(path.name for path in self.directory.glob("*.db")),
+            [STOPPED_FILE],
+        )
+
+    def test_token_is_required(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        self.assertEqual(self.scrape().status_code, 200)
+        with override_settings(METRICS_TOKEN=""):
+            self.assertEqual(self.scrape().status_code, 403)
+
+    def test_unknown_methods_share_a_label(self):
+        self.client.generic("BREW", reverse("login:quiz_list"))
+        body = render(self.directory)
+        self.assertIn(
+            'django_http_requests_total{view="login:quiz_list",'
+            'method="other",',
+            body,
+        )
+        self.assertNotIn("BREW", body)
+
+    def test_failing_gauge_is_left_out(self):
+        self.client.get(reverse("login:quiz_list"))
+        with patch(
+            "login.utils.outbox.OUTBOX_DEPTH.function",
+            side_effect=OperationalError("no such table"),
+        ), self.assertLogs("mysite.metrics", "ERROR"):
+            response = self.scrape()
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn("# TYPE outbox_emails gauge", body)
+        self.assertNotIn("outbox_emails{", body)
+        self.assertIn("django_http_requests_total{", body)
+
+
+class FileUploadTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        override = override_settings(
+            FILE_UPLOAD_DIR=directory.name,
+            FILE_UPLOAD_MAX_SIZE=64 * 1024,
+            FILE_VIEW_PAGE_LINES=10,
+            FILE_LINE_INDEX_STRIDE=4,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        # Multi-byte characters straddle chunk and range edges.
+        self.content = "".join(
+            f"line {i} héllo wörld ✓\n" for i in range(95)
+        ).encode()
+        self.user = User.objects.create_user(username="uploader")
+        self.client.force_login(self.user)
+
+    def upload(self, content):
+        return self.client.post(
+            reverse("login:file_upload"),
+            {"file": SimpleUploadedFile("notes.txt", content)},
+        )
+
+    def read_pages(self, url):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            pages.append(b"".join(response.streaming_content))
+            link = response.get("Link", "")
+            url = next(
+                (
+                    part.split(">")[0].lstrip(" <")
+                    for part in link.split(",")
+                    if 'rel="next"' in part
+                ),
+                None,
+            )
+        return pages
+
+    def test_file_is_served_in_line_pages(self):
+        response = self.upload(self.content)
+        pages = self.read_pages(response["Location"])
+        self.assertEqual(len(pages), 10)
+        self.assertEqual(pages[0].count(b"\n"), 10)
+        self.assertEqual(b"".join(pages), self.content)
+
+    def test_identical_files_are_stored_once(self):
+        first = self.upload(self.content)["Location"]
+        second = self.upload(self.content)["Location"]
+        self.assertEqual(first, second)
+        stored = [p for p in self.directory.rglob("*") if p.is_file()]
+        # The file and its line index.
+        self.assertEqual(len(stored), 2)
+
+    def test_line_range(self):
+        url = self.upload(self.content)["Location"]
+        response = self.client.get(url, {"lines": "37-38"})
+        self.assertEqual(
+            b"".join(response.streaming_content).decode(),
+            "line 37 héllo wörld ✓\nline 38 héllo wörld ✓\n",
+        )
+        self.assertEqual(response["X-Lines"], "37-38/95")
+
+    def test_byte_range(self):
+        url = self.upload(self.content)["Location"]
+        response = self.client.get(url, HTTP_RANGE="bytes=5-9")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"0 h\xc3\xa9")
+        self.assertEqual(
+            response["Content-Range"], f"bytes 5-9/{len(self.content)}"
+        )
+        response = self.client.get(url, HTTP_RANGE="bytes=-4")
+        self.assertEqual(
+            b"".join(response.streaming_content), self.content[-4:]
+        )
+        response = self.client.get(url, HTTP_RANGE="bytes=99999-")
+        self.assertEqual(response.status_code, 416)
+
+    def test_invalid_byte_range_is_ignored(self):
+        url = self.upload(self.content)["Location"]
+        for header in ("bytes=0-1,5-6", "bytes=9-5", "lines=1-2", "bytes=x-"):
+            response = self.client.get(url, HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(response["X-Lines"], "0-9/95")
+
+    def test_unread_range_closes_the_file(self):
+        digest = self.upload(self.content)["Location"].rstrip("/")[-64:]
+        stored = StoredFile(digest)
+        response = StreamingHttpResponse(stored.iter_range(0, 10))
+        response.close()
+        self.assertTrue(stored._file.closed)
+
+    def test_unterminated_last_line(self):
+        url = self.upload(b"first\nsecond")["Location"]
+        response = self.client.get(url, {"lines": "1-1"})
+        self.assertEqual(b"".join(response.streaming_content), b"second")
+        self.assertEqual(response["X-Lines"], "1-1/2")
+
+    def test_invalid_utf8_is_rejected(self):
+        response = self.upload(b"abc\xff")
+        self.assertContains(response, "not valid UTF-8")
+        self.assertFalse([p for p in self.directory.rglob("*") if p.is_file()])
+
+    def test_large_file_is_rejected(self):
+        response = self.upload(b"a" * (128 * 1024))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Location", response)
+
+    def test_unknown_file(self):
+        response = self.client.get(
+            reverse("login:view_file", args=("0" * 64,))
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_login_is_required(self):
+        url = self.upload(self.content)["Location"]
+        self.client.logout()
+        for response in (self.client.get(url), self.upload(self.content)):
+            self.assertEqual(response.status_code, 302)
+            self.assertIn(reverse("login:login"), response["Location"])
+
+    def test_only_the_uploader_can_read_a_file(self):
+        url = self.upload(self.content)["Location"]
+        self.client.force_login(User.objects.create_user(username="other"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+        # Uploading the same content gives the other user access too.
+        self.upload(self.content)
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(
+            list(Upload.objects.values_list("size", flat=True)),
+            [len(self.content)] * 2,
+        )
+
+    @override_settings(FILE_UPLOAD_USER_QUOTA=3000)
+    def test_upload_quota(self):
+        self.upload(self.content)
+        # Uploading a stored file again takes no more space.
+        self.assertIn("Location", self.upload(self.content))
+        response = self.upload(b"more\n" * 200)
+        self.assertContains(response, "used up your upload space")
+        self.assertEqual(Upload.objects.count(), 1)
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
+
+    def test_compare_with_baseline(self):
+        baseline = {"quiz_list": {"p95_ms": 10, "queries": 2}}
+        self.assertEqual(
+            compare(
+                {"quiz_list": {"p95_ms": 12, "queries": 2}}, baseline, 0.25
+            ),
+            [],
+        )
+        self.assertEqual(
+            compare(
+                {"quiz_list": {"p95_ms": 13, "queries": 3}}, baseline, 0.25
+            ),
+            [
+                "quiz_list: p95_ms 13 > baseline 10",
+                "quiz_list: queries 3 > baseline 2",
+            ],
+        )
+        # Small latency changes are timer noise.
+        self.assertEqual(
+            compare(
+                {"quiz_list": {"p95_ms": 13, "queries": 2}},
+                baseline,
+                0.25,
+                min_delta_ms=5,
+            ),
+            [],
+        )
+
+    def test_shared_baseline_compares_query_counts(self):
+        baseline = {"quiz_list": {"queries": 4}}
+        self.assertEqual(
+            compare({"quiz_list": {"p95_ms": 99, "queries": 4}}, baseline, 0),
+            [],
+        )
+        self.assertEqual(
+            compare({"quiz_list": {"p95_ms": 1, "queries": 5}}, baseline, 0),
+            ["quiz_list: queries 5 > baseline 4"],
+        )
+
+    def test_baseline_keeps_query_counts_only(self):
+        results = {"result": {"p50_ms": 4.2, "queries": 3, "peak_kib": 90}}
+        self.assertEqual(baseline_metrics(results), {"result": {"queries": 3}})
+
+    def test_scenarios_run(self):
+        quiz, poll = seed_benchmark_data(users=3, questions=3)
+        scenarios = Scenarios(quiz, poll)
+        scenarios.prepare_result()
+        result = measure(
+            scenarios.questions_run,
+            iterations=2,
+            warmup=1,
+            setup=scenarios.setup_questions_run,
+        )
+        self.assertEqual(
+            set(result), {"p50_ms", "p95_ms", "p99_ms", "queries", "peak_kib"}
+        )
+        # Four runs by the two users that take turns, and the result run.
+        self.assertEqual(User.objects.count(), 3)
+        self.assertEqual(
+            QuizSubmission.objects.filter(
+                status=QuizSubmission.Status.SUBMITTED
+            ).count(),
+            3,
+        )
+        self.assertGreater(
+            measure(scenarios.result, iterations=2)["queries"], 0
+        )
+
+
+class SyntheticDatasetTests(TestCase):
+    def answer_rows(self):
+        return sorted(
+            Answer.objects.values_list(
+                "submission__user__username",
+                "question__text",
+                "answer_choice__text",
+            )
+        )
+
+    def test_generates_realistic_submissions(self):
+        created = generate_dataset(
+            seed=1, users=40, quizzes=2, questions=5, polls=3, votes=300
+        )
+
+        self.assertEqual(User.objects.count(), 40)
+        self.assertEqual(created["answers"], Answer.objects.count())
+        # Bulk loading does not queue welcome emails.
+        self.assertFalse(OutboxEmail.objects.exists())
+        for submission in QuizSubmission.objects.annotate(
+            answered=Count("answers")
+        ):
+            if submission.status == QuizSubmission.Status.SUBMITTED:
+                self.assertEqual(submission.answered, 5)
+                self.assertLessEqual(
+                    submission.started_at, submission.completed_at
+                )
+            else:
+                self.assertLess(submission.answered, 5)
+            self.assertLessEqual(
+                submission.quiz.start_time, submission.started_at
+            )
+        correct = Answer.objects.filter(answer_choice__is_correct=True)
+        self.assertTrue(0 < correct.count() < Answer.objects.count())
+        # Per-choice vote counts are rounded.
+        self.assertAlmostEqual(
+            PollChoice.objects.aggregate(total=Sum("votes"))["total"],
+            300,
+            delta=10,
+        )
+
+    def test_same_seed_generates_same_data(self):
+        generate_dataset(seed=7, users=20, quizzes=1, questions=4, polls=0)
+        first = self.answer_rows()
+        User.objects.all().delete()
+        Quiz.objects.all().delete()
+        generate_dataset(seed=7, users=20, quizzes=1, questions=4, polls=0)
+        self.assertEqual(self.answer_rows(), first)
+
+    def test_grade_stores_results(self):
+        created = generate_dataset(
+            users=20, quizzes=1, questions=4, grade=True, polls=0
+        )
+        self.assertEqual(created["results"], QuizResult.objects.count())
+        self.assertEqual(
+            QuestionStat.objects.aggregate(total=Sum("attempts"))["total"],
+            created["results"] * 4,
+        )
+
+    def test_command_rejects_existing_prefix(self):
+        User.objects.create_user("synthetic0")
+        with self.assertRaises(CommandError):
+            call_command("generate_dataset", users=1, stdout=StringIO())
@@ -26,5 +26,12 @@ urlpatterns = [
     ),
     path("result/<int:quiz_id>/", quiz_views.result, name="result"),
     path("quiz_list/", quiz_views.quiz_list, name="quiz_list"),
+    path("analytics/<int:quiz_id>/", quiz_views.analytics, name="analytics"),
+    path(
+        "export/<int:quiz_id>/",
+        quiz_views.export_submissions,
+        name="export_submissions",
+    ),
     path("file_upload/", file_views.file_upload, name="file_upload"),
+    path("files/<str:digest>/", file_views.view_file, name="view_file"),
 ]
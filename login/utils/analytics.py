@@ -0,0 +1,192 @@
+import math
+
+from django.db import transaction
+from django.db.models import F
+
+from login.models import (
+    Choice,
+    ChoiceStat,
+    QuestionStat,
+    Quiz,
+    QuizResult,
+)
+
+
+def create_stat_rows(quiz_ids):
+    """
+    Create the missing counter rows of the questions and choices of the
+    given quizzes, so grading only has to update them.
+    """
+    quiz_ids = set(quiz_ids)
+    if not quiz_ids:
+        return
+    QuizQuestion = Quiz.questions.through
+    QuestionStat.objects.bulk_create(
+        [
+            QuestionStat(quiz_id=quiz_id, question_id=question_id)
+            for quiz_id, question_id in QuizQuestion.objects.filter(
+                quiz_id__in=quiz_ids
+            ).values_list("quiz_id", "question_id")
+        ],
+        ignore_conflicts=True,
+    )
+    ChoiceStat.objects.bulk_create(
+        [
+            ChoiceStat(quiz_id=quiz_id, choice_id=choice_id)
+            for quiz_id, choice_id in Choice.objects.filter(
+                question__quizzes__in=quiz_ids
+            ).values_list("question__quizzes", "id")
+        ],
+        ignore_conflicts=True,
+    )
+
+
+def record_result(snapshot, outcomes, score):
+    """
+    Add one graded submission to the quiz counters.
+
+    Every counter is bumped with an atomic `F()` update, one statement per
+    counter group, so concurrent graders never lose increments. The rows
+    are created with the quiz's questions and choices (`create_stat_rows`).
+    """
+    picked = [
+        o["selected_choice_id"] for o in outcomes if o["selected_choice_id"]
+    ]
+    answered = [o["question_id"] for o in outcomes if o["selected_choice_id"]]
+    correct = [o["question_id"] for o in outcomes if o["is_correct"]]
+
+    with transaction.atomic():
+        ChoiceStat.objects.filter(
+            quiz_id=snapshot.id, choice_id__in=picked
+        ).update(picks=F("picks") + 1)
+        QuestionStat.objects.filter(
+            quiz_id=snapshot.id, question_id__in=answered
+        ).update(
+            attempts=F("attempts") + 1,
+            score_sum=F("score_sum") + score,
+            score_sq_sum=F("score_sq_sum") + score * score,
+        )
+        QuestionStat.objects.filter(
+            quiz_id=snapshot.id, question_id__in=correct
+        ).update(
+            correct_count=F("correct_count") + 1,
+            correct_score_sum=F("correct_score_sum") + score,
+        )
+
+
+def rebuild_quiz_stats(snapshot, chunk_size=2000):
+    """
+    Recompute the counters of a quiz from its stored results.
+
+    Results are streamed in chunks and only the per-question and per-choice
+    totals are kept in memory.
+    """
+    question_stats = {
+        question.id: QuestionStat(quiz_id=snapshot.id, question_id=question.id)
+        for question in snapshot.questions
+    }
+    choice_stats = {
+        choice_id: ChoiceStat(quiz_id=snapshot.id, choice_id=choice_id)
+        for choice_id in snapshot.choices
+    }
+
+    results = (
+        QuizResult.objects.filter(submission__quiz_id=snapshot.id)
+        .values_list("score", "outcomes")
+        .iterator(chunk_size=chunk_size)
+    )
+    for score, outcomes in results:
+        for outcome in outcomes:
+            stat = question_stats.get(outcome["question_id"])
+            choice_stat = choice_stats.get(outcome["selected_choice_id"])
+            if stat is None or choice_stat is None:
+                continue
+            choice_stat.picks += 1
+            stat.attempts += 1
+            stat.score_sum += score
+            stat.score_sq_sum += score * score
+            if outcome["is_correct"]:
+                stat.correct_count += 1
+                stat.correct_score_sum += score
+
+    with transaction.atomic():
+        QuestionStat.objects.filter(quiz_id=snapshot.id).delete()
+        ChoiceStat.objects.filter(quiz_id=snapshot.id).delete()
+        QuestionStat.objects.bulk_create(
+            question_stats.values(), batch_size=chunk_size
+        )
+        ChoiceStat.objects.bulk_create(
+            choice_stats.values(), batch_size=chunk_size
+        )
+
+
+def discrimination_index(stat):
+    """
+    Point-biserial correlation between answering a question correctly and
+    the total score, or None when it is undefined.
+    """
+    n, c = stat.attempts, stat.correct_count
+    if n == 0 or c in (0, n):
+        return None
+    mean = stat.score_sum / n
+    variance = stat.score_sq_sum / n - mean * mean
+    if variance <= 0:
+        return None
+    correct_mean = stat.correct_score_sum / c
+    wrong_mean = (stat.score_sum - stat.correct_score_sum) / (n - c)
+    p = c / n
+    return (
+        (correct_mean - wrong_mean)
+        / math.sqrt(variance)
+        * math.sqrt(p * (1 - p))
+    )
+
+
+def _choice_analytics(choice, picks, attempts):
+    return {
+        "text": choice.text,
+        "is_correct": choice.is_correct,
+        "picks": picks,
+        "pick_rate": round(picks / attempts * 100, 2) if attempts else None,
+    }
+
+
+def quiz_analytics(snapshot):
+    """Return the item analysis of every question of a quiz."""
+    question_stats = {
+        stat.question_id: stat
+        for stat in QuestionStat.objects.filter(quiz_id=snapshot.id)
+    }
+    picks = dict(
+        ChoiceStat.objects.filter(quiz_id=snapshot.id).values_list(
+            "choice_id", "picks"
+        )
+    )
+
+    analytics = []
+    for question in snapshot.questions:
+        stat = question_stats.get(question.id) or QuestionStat()
+        attempts = stat.attempts
+        analytics.append(
+            {
+                "question": question.text,
+                "attempts": attempts,
+                "percent_correct": (
+                    round(stat.correct_count / attempts * 100, 2)
+                    if attempts
+                    else None
+                ),
+                "discrimination": (
+                    None
+                    if (index := discrimination_index(stat)) is None
+                    else round(index, 3)
+                ),
+                "choices": [
+                    _choice_analytics(
+                        choice, picks.get(choice.id, 0), attempts
+                    )
+                    for choice in question.choices
+                ],
+            }
+        )
+    return analytics
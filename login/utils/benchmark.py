@@ -0,0 +1,255 @@
+import datetime
+import math
+import statistics
+import time
+import tracemalloc
+from contextlib import ExitStack
+from itertools import count, cycle
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+
+from login.models import Choice, Question, Quiz, QuizSubmission
+from login.utils.grading import claim_grading_jobs, run_grading_job
+from polls.models import Choice as PollChoice
+from polls.models import Question as PollQuestion
+
+BENCHMARK_PASSWORD = "benchmark-password"
+BENCHMARK_USERS = 5
+QUESTIONS_PER_PAGE = 2
+# Metrics that do not depend on the machine, so the committed baseline
+# saved on one machine holds on another.
+BASELINE_METRICS = ("queries",)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def seed_benchmark_data(users, questions):
+    """
+    Create the quiz, poll and users the scenarios run against.
+
+    Users share one password hash, so seeding does not hash per user.
+    """
+    now = timezone.now()
+    password = make_password(BENCHMARK_PASSWORD)
+    User.objects.bulk_create(
+        User(username=f"bench{i}", password=password) for i in range(users)
+    )
+    quiz = Quiz.objects.create(
+        name="Benchmark quiz",
+        start_time=now,
+        end_time=now + datetime.timedelta(days=1),
+    )
+    created = Question.objects.bulk_create(
+        Question(text=f"Benchmark question {i}") for i in range(questions)
+    )
+    Choice.objects.bulk_create(
+        Choice(question=question, text=f"Choice {j}", is_correct=j == 0)
+        for question in created
+        for j in range(4)
+    )
+    quiz.questions.add(*created)
+
+    poll = PollQuestion.objects.create(
+        question_text="Benchmark poll", pub_date=now
+    )
+    PollChoice.objects.bulk_create(
+        PollChoice(question=poll, choice_text=f"Choice {i}") for i in range(4)
+    )
+    return quiz, poll
+
+
+class Scenarios:
+    """
+    The request flows measured by the benchmark. Each scenario is a method
+    that performs one sample, typically one request, after its optional
+    `setup_<name>` method.
+
+    The first user keeps a graded submission for `result` and the others
+    take turns running the quiz, so the number of users stays fixed.
+    """
+
+    NAMES = (
+        "login",
+        "questions_run",
+        "result",
+        "quiz_list",
+        "polls_index",
+        "polls_detail",
+        "polls_vote",
+    )
+
+    def __init__(self, quiz, poll):
+        self.quiz = quiz
+        self.poll = poll
+        users = list(User.objects.order_by("id"))
+        self.result_client = self.client(users[0])
+        self.runners = cycle([(user, self.client(user)) for user in users[1:]])
+        self.run_client = None
+        self.answers = {
+            question_id: choice_id
+            for question_id, choice_id in Choice.objects.filter(
+                question__quizzes=quiz, is_correct=True
+            ).values_list("question_id", "id")
+        }
+        self.vote_choice = poll.choice_set.first()
+        self.ips = count()
+
+    def client(self, user):
+        client = Client()
+        client.force_login(user)
+        return client
+
+    def login(self):
+        ip = next(self.ips)
+        Client().post(
+            reverse("login:login"),
+            {"username": "bench0", "password": BENCHMARK_PASSWORD},
+            REMOTE_ADDR=f"10.{ip // 65536 % 256}.{ip // 256 % 256}.{ip % 256}",
+        )
+
+    def setup_questions_run(self):
+        """Let the next user run the quiz again."""
+        user, self.run_client = next(self.runners)
+        QuizSubmission.objects.filter(user=user, quiz=self.quiz).delete()
+
+    def questions_run(self):
+        """Load, answer and submit every page of the quiz."""
+        client = self.run_client
+        url = reverse("login:questions", args=(self.quiz.id,))
+        client.get(url)
+        question_ids = sorted(self.answers)
+        pages = range(0, len(question_ids), QUESTIONS_PER_PAGE)
+        for number, start in enumerate(pages, start=1):
+            data = {
+                f"question_{question_id}": self.answers[question_id]
+                for question_id in question_ids[
+                    start : start + QUESTIONS_PER_PAGE
+                ]
+            }
+            if start + QUESTIONS_PER_PAGE >= len(question_ids):
+                data["submitted"] = "true"
+            else:
+                data["page"] = number + 1
+            client.post(url, data)
+
+    def prepare_result(self):
+        """Submit and grade one run, so `result` has something to show."""
+        url = reverse("login:questions", args=(self.quiz.id,))
+        self.result_client.post(
+            url,
+            {
+                "submitted": "true",
+                **{
+                    f"question_{question_id}": choice_id
+                    for question_id, choice_id in self.answers.items()
+                },
+            },
+        )
+        for job in claim_grading_jobs(100):
+            run_grading_job(job)
+
+    def result(self):
+        self.result_client.get(reverse("login:result", args=(self.quiz.id,)))
+
+    def quiz_list(self):
+        self.result_client.get(reverse("login:quiz_list"))
+
+    def polls_index(self):
+        Client().get(reverse("polls:index"))
+
+    def polls_detail(self):
+        Client().get(reverse("polls:detail", args=(self.poll.id,)))
+
+    def polls_vote(self):
+        Client().post(
+            reverse("polls:vote", args=(self.poll.id,)),
+            {"choice": self.vote_choice.id},
+        )
+
+
+def measure(sample, iterations, warmup=2, setup=None):
+    """
+    Run `sample` and return its latency percentiles (milliseconds), median
+    query count and peak allocated memory (KiB). `setup`, if given, runs
+    before every sample and is not measured.
+    """
+    setup = setup or (lambda: None)
+    for _ in range(warmup):
+        setup()
+        sample()
+
+    latencies, queries = [], []
+    for _ in range(iterations):
+        executed = []
+
+        def count_query(execute, sql, params, many, context):
+            executed.append(sql)
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            setup()
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            started = time.perf_counter()
+            sample()
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(executed))
+
+    # Allocations are traced in a separate run, as tracing slows it down.
+    setup()
+    tracemalloc.start()
+    try:
+        sample()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "queries": statistics.median(queries),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def baseline_metrics(results):
+    """Keep the metrics of `results` that belong in the shared baseline."""
+    return {
+        name: {metric: metrics[metric] for metric in BASELINE_METRICS}
+        for name, metrics in results.items()
+    }
+
+
+def compare(results, baseline, tolerance, query_tolerance=0, min_delta_ms=0):
+    """
+    Return a message for every metric of `results` that is worse than its
+    `baseline` by more than the given fraction. Latencies must also be
+    worse by more than `min_delta_ms`, so timer noise on fast views is not
+    reported. Metrics missing from `baseline` are not compared.
+    """
+    regressions = []
+    for name, metrics in results.items():
+        for metric, value in metrics.items():
+            expected = baseline.get(name, {}).get(metric)
+            if expected is None:
+                continue
+            allowed = query_tolerance if metric == "queries" else tolerance
+            if value <= expected * (1 + allowed):
+                continue
+            if metric.endswith("_ms") and value - expected <= min_delta_ms:
+                continue
+            regressions.append(
+                f"{name}: {metric} {value} > baseline {expected}"
+            )
+    return regressions
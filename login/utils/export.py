@@ -0,0 +1,74 @@
+import csv
+import json
+
+from login.models import Answer, QuizSubmission
+
+EXPORT_FIELDS = [
+    "submission_id",
+    "username",
+    "question",
+    "choice",
+    "is_correct",
+    "submitted_at",
+]
+
+
+class Echo:
+    """File-like object whose write() returns the value instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def iter_answer_rows(quiz_id, chunk_size=2000):
+    """
+    Yield one dict per answer of a quiz, joined with the user, the question
+    and the chosen choice.
+
+    Answers are read through a server-side cursor `chunk_size` rows at a
+    time, so memory does not grow with the number of answers.
+    """
+    answers = (
+        Answer.objects.filter(
+            submission__quiz_id=quiz_id,
+            submission__status=QuizSubmission.Status.SUBMITTED,
+        )
+        .select_related("submission__user", "question", "answer_choice")
+        .only(
+            "submitted_at",
+            "submission__id",
+            "submission__user__username",
+            "question__text",
+            "answer_choice__text",
+            "answer_choice__is_correct",
+        )
+        .order_by("submission_id", "id")
+        .iterator(chunk_size=chunk_size)
+    )
+    for answer in answers:
+        yield {
+            "submission_id": answer.submission_id,
+            "username": answer.submission.user.username,
+            "question": answer.question.text,
+            "choice": answer.answer_choice.text,
+            "is_correct": answer.answer_choice.is_correct,
+            "submitted_at": answer.submitted_at.isoformat(),
+        }
+
+
+def iter_csv(rows):
+    writer = csv.DictWriter(Echo(), fieldnames=EXPORT_FIELDS)
+    yield writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_jsonl(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+EXPORT_FORMATS = {
+    "csv": (iter_csv, "text/csv"),
+    "jsonl": (iter_jsonl, "application/x-ndjson"),
+}
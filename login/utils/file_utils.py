@@ -1,3 +1,242 @@
-def handle_uploaded_file(file):
-    data = "".join([line.decode("utf-8") for line in file.readlines()])
-    return data
+import codecs
+import hashlib
+import mmap
+import os
+import re
+import tempfile
+from array import array
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db.models import Sum
+
+from login.models import Upload
+
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+# Size in bytes of the entries of a line index file.
+INDEX_ITEM_SIZE = array("Q").itemsize
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """Abort uploads larger than `FILE_UPLOAD_MAX_SIZE` while receiving."""
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.FILE_UPLOAD_MAX_SIZE:
+            raise StopUpload(connection_reset=True)
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+
+def store_path(digest):
+    """Path of a stored file, sharded by the first two digest characters."""
+    return Path(settings.FILE_UPLOAD_DIR) / digest[:2] / digest
+
+
+def index_path(digest):
+    return store_path(digest).with_suffix(".idx")
+
+
+class LineIndex:
+    """
+    Sparse index of the line starts of a file.
+
+    The index file holds the number of lines, the stride and the offset of
+    every `stride`-th line, so the start of any line is found with one
+    lookup and a scan of fewer than `stride` lines.
+    """
+
+    def __init__(self, stride):
+        self.stride = stride
+        self.offsets = array("Q", [0])
+        self.lines = 0
+        self.size = 0
+        self.ends_with_newline = True
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        newlines = chunk.count(b"\n")
+        if self.lines % self.stride + newlines < self.stride:
+            self.lines += newlines
+        else:
+            position = -1
+            for _ in range(newlines):
+                position = chunk.find(b"\n", position + 1)
+                self.lines += 1
+                if self.lines % self.stride == 0:
+                    self.offsets.append(self.size + position + 1)
+        self.size += len(chunk)
+        self.ends_with_newline = chunk.endswith(b"\n")
+
+    @property
+    def total_lines(self):
+        return self.lines + (0 if self.ends_with_newline else 1)
+
+    def write(self, path):
+        header = array("Q", [self.total_lines, self.stride])
+        with open(path, "wb") as out:
+            header.tofile(out)
+            self.offsets.tofile(out)
+
+    @classmethod
+    def build(cls, path, stride, chunk_size=64 * 1024):
+        index = cls(stride)
+        with open(path, "rb") as stored:
+            while chunk := stored.read(chunk_size):
+                index.feed(chunk)
+        return index
+
+
+def read_index_header(path):
+    """Return the (number of lines, stride) of a line index file."""
+    header = array("Q")
+    with open(path, "rb") as index:
+        header.fromfile(index, 2)
+    return header[0], header[1]
+
+
+def read_index_offset(path, entry):
+    offset = array("Q")
+    with open(path, "rb") as index:
+        index.seek((2 + entry) * INDEX_ITEM_SIZE)
+        offset.fromfile(index, 1)
+    return offset[0]
+
+
+def _check_quota(user, digest, size):
+    """Raise `ValidationError` if storing a new file exceeds the quota."""
+    uploads = Upload.objects.filter(user=user)
+    if uploads.filter(digest=digest).exists():
+        return
+    used = uploads.aggregate(total=Sum("size"))["total"] or 0
+    if used + size > settings.FILE_UPLOAD_USER_QUOTA:
+        raise ValidationError("You have used up your upload space.")
+
+
+def handle_uploaded_file(file, user):
+    """
+    Check and store a text file uploaded by `user`, one chunk at a time.
+
+    Files are stored once per SHA-256 digest of their content, next to a
+    line index, and each uploader gets an `Upload` row for it. Returns the
+    digest. Raises `ValidationError` if the file is too large, not UTF-8
+    or over the user's upload quota.
+    """
+    if file.size > settings.FILE_UPLOAD_MAX_SIZE:
+        raise ValidationError("The file is too large.")
+
+    digest = hashlib.sha256()
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    index = LineIndex(settings.FILE_LINE_INDEX_STRIDE)
+    directory = Path(settings.FILE_UPLOAD_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    descriptor, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+    try:
+        with os.fdopen(descriptor, "wb") as out:
+            for chunk in file.chunks():
+                # The incremental decoder keeps characters split across
+                # chunks intact.
+                decoder.decode(chunk)
+                digest.update(chunk)
+                index.feed(chunk)
+                out.write(chunk)
+            decoder.decode(b"", final=True)
+
+        name = digest.hexdigest()
+        _check_quota(user, name, index.size)
+        path = store_path(name)
+        if path.exists():
+            os.unlink(temp_path)
+        else:
+            path.parent.mkdir(exist_ok=True)
+            # The index goes first, so a stored file always has one.
+            index.write(index_path(name))
+            os.replace(temp_path, path)
+    except UnicodeDecodeError:
+        os.unlink(temp_path)
+        raise ValidationError("The file is not valid UTF-8 text.")
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+    Upload.objects.get_or_create(
+        user=user, digest=name, defaults={"size": index.size}
+    )
+    return name
+
+
+class StoredFile:
+    """A stored upload, memory mapped for random access."""
+
+    def __init__(self, digest):
+        if not DIGEST.match(digest) or not store_path(digest).is_file():
+            raise FileNotFoundError(digest)
+        self.digest = digest
+        self.path = store_path(digest)
+        self.size = self.path.stat().st_size
+        if not index_path(digest).is_file():
+            LineIndex.build(self.path, settings.FILE_LINE_INDEX_STRIDE).write(
+                index_path(digest)
+            )
+        self.total_lines, self.stride = read_index_header(index_path(digest))
+        self._file = open(self.path, "rb")
+        # Empty files cannot be mapped.
+        self._map = (
+            mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            if self.size
+            else b""
+        )
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def line_offset(self, line):
+        """Byte offset of the start of `line` (0-based)."""
+        if line >= self.total_lines:
+            return self.size
+        offset = read_index_offset(
+            index_path(self.digest), line // self.stride
+        )
+        for _ in range(line % self.stride):
+            offset = self._map.find(b"\n", offset) + 1
+        return offset
+
+    def line_range(self, first, count):
+        """Byte range of `count` lines starting at line `first`."""
+        return self.line_offset(first), self.line_offset(first + count)
+
+    def iter_range(self, start, end, chunk_size=64 * 1024):
+        """
+        Return an iterable over the bytes between `start` and `end`, whose
+        `close()` closes the file. Streaming responses call it when they
+        are closed, whether or not the content was read.
+        """
+        return ByteRange(self, start, end, chunk_size)
+
+
+class ByteRange:
+    def __init__(self, stored, start, end, chunk_size):
+        self.stored = stored
+        self.start = start
+        self.end = end
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        for offset in range(self.start, self.end, self.chunk_size):
+            yield self.stored._map[
+                offset : min(offset + self.chunk_size, self.end)
+            ]
+
+    def close(self):
+        self.stored.close()
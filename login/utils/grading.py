@@ -0,0 +1,165 @@
+import datetime
+import uuid
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from login.models import GradingJob, QuizResult
+from login.utils.analytics import record_result
+from login.utils.quiz_cache import get_quiz_snapshot
+
+
+def build_outcomes(snapshot, selected):
+    """
+    Grade `selected` (question id -> choice id) against a quiz snapshot.
+
+    Returns a tuple of (correct_count, outcomes) where `outcomes` is the
+    per-question review stored on the `QuizResult`.
+    """
+    correct_count = 0
+    outcomes = []
+    for question in snapshot.questions:
+        selected_choice = snapshot.choices.get(selected.get(question.id))
+        correct_choice = question.correct_choice
+        is_correct = (
+            selected_choice is not None
+            and correct_choice is not None
+            and selected_choice.id == correct_choice.id
+        )
+        if is_correct:
+            correct_count += 1
+
+        outcomes.append(
+            {
+                "question_id": question.id,
+                "question": question.text,
+                "selected_choice_id": selected_choice and selected_choice.id,
+                "selected_choice": selected_choice and selected_choice.text,
+                "correct_choice_id": correct_choice and correct_choice.id,
+                "correct_answer": correct_choice and correct_choice.text,
+                "is_correct": is_correct,
+            }
+        )
+    return correct_count, outcomes
+
+
+def grade_submission(submission) -> QuizResult:
+    """
+    Grade a submission and store the outcome as its `QuizResult`.
+
+    Grading runs a fixed number of queries regardless of how many questions
+    the quiz has, so the result page only has to read the stored record.
+    """
+    snapshot = get_quiz_snapshot(submission.quiz_id)
+    selected = dict(
+        submission.answers.values_list("question_id", "answer_choice_id")
+    )
+
+    correct_count, outcomes = build_outcomes(snapshot, selected)
+    total = len(snapshot.questions)
+    score = round((correct_count / total) * 100, 2) if total > 0 else 0
+
+    with transaction.atomic():
+        result, created = QuizResult.objects.update_or_create(
+            submission=submission,
+            defaults={
+                "score": score,
+                "correct_count": correct_count,
+                "total": total,
+                "outcomes": outcomes,
+            },
+        )
+        if created:
+            record_result(snapshot, outcomes, score)
+        if submission.completed_at is None:
+            submission.completed_at = timezone.now()
+            submission.save(update_fields=["completed_at"])
+    return result
+
+
+def enqueue_grading(submission) -> GradingJob:
+    """Queue a submission for the background grading worker."""
+    job, _ = GradingJob.objects.get_or_create(submission=submission)
+    return job
+
+
+def claim_grading_jobs(batch_size, stale_after=300, retry_after=60):
+    """
+    Claim up to `batch_size` pending jobs for this worker.
+
+    Jobs left running for more than `stale_after` seconds are assumed to
+    belong to a dead worker and are claimed again. Jobs whose last attempt
+    failed wait `retry_after` seconds before they are claimed again.
+    """
+    now = timezone.now()
+    claim = uuid.uuid4().hex
+    claimable = Q(
+        Q(claimed_at__isnull=True)
+        | Q(claimed_at__lt=now - datetime.timedelta(seconds=retry_after)),
+        status=GradingJob.Status.PENDING,
+    ) | Q(
+        status=GradingJob.Status.RUNNING,
+        claimed_at__lt=now - datetime.timedelta(seconds=stale_after),
+    )
+
+    with transaction.atomic():
+        job_ids = list(
+            GradingJob.objects.select_for_update(skip_locked=True)
+            .filter(claimable)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        # The claimable condition is repeated so that two workers racing
+        # for the same rows on a backend without row locks claim each job
+        # only once.
+        GradingJob.objects.filter(claimable, id__in=job_ids).update(
+            status=GradingJob.Status.RUNNING,
+            claimed_by=claim,
+            claimed_at=now,
+            attempts=F("attempts") + 1,
+        )
+
+    return list(
+        GradingJob.objects.filter(
+            claimed_by=claim, status=GradingJob.Status.RUNNING
+        ).select_related("submission")
+    )
+
+
+def run_grading_job(job, max_attempts=3) -> bool:
+    """
+    Grade the submission of a claimed job.
+
+    Failed jobs are put back in the queue until they reach `max_attempts`,
+    then marked as failed until `requeue_failed_jobs` is called.
+    """
+    try:
+        grade_submission(job.submission)
+    except Exception as error:
+        job.status = (
+            GradingJob.Status.PENDING
+            if job.attempts < max_attempts
+            else GradingJob.Status.FAILED
+        )
+        job.last_error = repr(error)
+        job.save(update_fields=["status", "last_error"])
+        return False
+
+    job.status = GradingJob.Status.DONE
+    job.last_error = ""
+    job.save(update_fields=["status", "last_error"])
+    return True
+
+
+def requeue_failed_jobs():
+    """
+    Put failed jobs back in the queue with a fresh set of attempts, e.g.
+    once the cause of the failures is fixed. Returns the number of jobs.
+    """
+    return GradingJob.objects.filter(status=GradingJob.Status.FAILED).update(
+        status=GradingJob.Status.PENDING,
+        attempts=0,
+        claimed_by="",
+        claimed_at=None,
+    )
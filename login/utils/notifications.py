@@ -0,0 +1,78 @@
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from login.models import NotificationDigest, OutboxEmail, Question
+
+# Number of question texts listed in a digest email.
+DIGEST_PREVIEW_SIZE = 10
+
+
+def _digest_message(count, preview):
+    lines = [
+        "Welcome Candidate,",
+        f"{count} new question{'s have' if count > 1 else ' has'} been added.",
+        "",
+    ]
+    lines += [f"- {text}" for text in preview]
+    if count > len(preview):
+        lines.append(f"- and {count - len(preview)} more")
+    lines += ["", "Please login to answer them."]
+    return "\n".join(lines)
+
+
+def send_question_digest(chunk_size=1000):
+    """
+    Queue one email per user listing the questions created since the last
+    digest.
+
+    Recipients are streamed as plain email addresses and their messages are
+    queued `chunk_size` at a time. Returns the number of questions covered
+    and the number of emails queued.
+    """
+    last = NotificationDigest.objects.order_by("-id").first()
+    last_question_id = last.last_question_id if last else 0
+    new_questions = Question.objects.filter(id__gt=last_question_id)
+
+    newest_id = (
+        new_questions.order_by("-id").values_list("id", flat=True).first()
+    )
+    if newest_id is None:
+        return 0, 0
+
+    new_questions = new_questions.filter(id__lte=newest_id)
+    count = new_questions.count()
+    preview = list(
+        new_questions.order_by("id").values_list("text", flat=True)[
+            :DIGEST_PREVIEW_SIZE
+        ]
+    )
+    message = _digest_message(count, preview)
+
+    recipients = (
+        User.objects.exclude(email="")
+        .order_by("id")
+        .values_list("email", flat=True)
+        .iterator(chunk_size=chunk_size)
+    )
+    queued = 0
+    with transaction.atomic():
+        while chunk := list(islice(recipients, chunk_size)):
+            OutboxEmail.objects.bulk_create(
+                OutboxEmail(
+                    subject="New Questions Available",
+                    body=message,
+                    from_email=settings.DEFAULT_FROM_EMAIL,
+                    recipients=[email],
+                )
+                for email in chunk
+            )
+            queued += len(chunk)
+        NotificationDigest.objects.create(
+            last_question_id=newest_id,
+            question_count=count,
+            recipient_count=queued,
+        )
+    return count, queued
@@ -0,0 +1,75 @@
+import hmac
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+
+from .rate_limit import TokenBucket, hashed_key
+
+email_bucket = TokenBucket("otp-email", *settings.OTP_EMAIL_RATE)
+ip_bucket = TokenBucket("otp-ip", *settings.OTP_IP_RATE)
+
+
+class OTPRateLimited(Exception):
+    pass
+
+
+def _key(purpose, email):
+    return f"otp:{purpose}:{hashed_key(email)}"
+
+
+def _digest(otp):
+    return salted_hmac("login.otp", otp).hexdigest()
+
+
+def issue_otp(purpose, email, client_ip, otp):
+    """
+    Store `otp` for `email` until it expires.
+
+    Raises `OTPRateLimited` if the email address or the client has requested
+    too many OTPs recently.
+    """
+    if not ip_bucket.consume(client_ip) or not email_bucket.consume(email):
+        raise OTPRateLimited
+    cache.set(
+        _key(purpose, email),
+        {
+            "digest": _digest(otp),
+            "attempts": 0,
+            "expires_at": time.time() + settings.OTP_EXPIRE_TIME,
+        },
+        settings.OTP_EXPIRE_TIME,
+    )
+
+
+def match_otp(purpose, email, otp) -> bool:
+    """
+    Check `otp` against the stored one in constant time, without using it
+    up, so the caller can validate the rest of its form first.
+
+    The OTP is dropped after too many wrong guesses.
+    """
+    key = _key(purpose, email)
+    stored = cache.get(key)
+    if not stored or not email:
+        return False
+
+    if hmac.compare_digest(stored["digest"], _digest(otp or "")):
+        return True
+
+    stored["attempts"] += 1
+    remaining = stored["expires_at"] - time.time()
+    if stored["attempts"] >= settings.OTP_MAX_ATTEMPTS or remaining < 1:
+        cache.delete(key)
+    else:
+        cache.set(key, stored, int(remaining))
+    return False
+
+
+def consume_otp(purpose, email) -> bool:
+    """
+    Use up the OTP of `email`. Returns False if it was already used, so
+    two requests racing with the same OTP cannot both succeed.
+    """
+    return bool(cache.delete(_key(purpose, email)))
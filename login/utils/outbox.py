@@ -0,0 +1,145 @@
+import datetime
+import uuid
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from login.models import OutboxEmail
+from mysite.metrics import CallbackGauge
+
+# Seconds before the first retry; doubled on every further attempt.
+RETRY_BACKOFF = 30
+MAX_RETRY_DELAY = 3600
+# Seconds a claimed batch stays reserved for the worker that claimed it.
+CLAIM_LEASE = 300
+
+
+def outbox_depth(values):
+    """Number of pending and dead emails, for the `/metrics` view."""
+    counts = dict(
+        OutboxEmail.objects.exclude(status=OutboxEmail.Status.SENT)
+        .values_list("status")
+        .annotate(count=Count("id"))
+    )
+    return [
+        ({"status": status}, counts.get(status, 0))
+        for status in (OutboxEmail.Status.PENDING, OutboxEmail.Status.DEAD)
+    ]
+
+
+OUTBOX_DEPTH = CallbackGauge(
+    "outbox_emails", "Emails waiting in the outbox by status.", outbox_depth
+)
+
+
+def enqueue_email(subject, message, recipient_list, from_email=None):
+    """Queue an email for the outbox worker instead of sending it inline."""
+    return OutboxEmail.objects.create(
+        subject=subject,
+        body=message,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        recipients=list(recipient_list),
+    )
+
+
+def retry_delay(attempts):
+    return min(RETRY_BACKOFF * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def claim_outbox(batch_size):
+    """
+    Reserve up to `batch_size` due messages for this worker by pushing
+    their next attempt past the claim lease.
+    """
+    now = timezone.now()
+    claim = uuid.uuid4().hex
+    due = {"status": OutboxEmail.Status.PENDING, "next_attempt_at__lte": now}
+
+    with transaction.atomic():
+        email_ids = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(**due)
+            .order_by("next_attempt_at", "id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        OutboxEmail.objects.filter(id__in=email_ids, **due).update(
+            claimed_by=claim,
+            next_attempt_at=now + datetime.timedelta(seconds=CLAIM_LEASE),
+        )
+
+    return list(
+        OutboxEmail.objects.filter(
+            claimed_by=claim, status=OutboxEmail.Status.PENDING
+        ).order_by("id")
+    )
+
+
+def _record_failure(email, error, max_attempts, now):
+    """Count a failed attempt and reschedule or dead-letter the message."""
+    email.attempts += 1
+    email.last_error = repr(error)
+    if email.attempts >= max_attempts:
+        email.status = OutboxEmail.Status.DEAD
+    else:
+        email.next_attempt_at = now + datetime.timedelta(
+            seconds=retry_delay(email.attempts)
+        )
+
+
+def deliver_outbox(batch_size=100, max_attempts=5, connection=None):
+    """
+    Send one batch of due messages over a single mail connection.
+
+    Failed messages are retried with exponential backoff and moved to the
+    dead status after `max_attempts`. If the connection cannot be opened,
+    that counts as a failed attempt for every message of the batch.
+    Returns a tuple of (sent, failed).
+    """
+    emails = claim_outbox(batch_size)
+    if not emails:
+        return 0, 0
+
+    connection = connection or get_connection(fail_silently=False)
+    sent = failed = 0
+    now = timezone.now()
+    try:
+        try:
+            connection.open()
+        except Exception as error:
+            for email in emails:
+                _record_failure(email, error, max_attempts, now)
+            failed = len(emails)
+        else:
+            for email in emails:
+                try:
+                    connection.send_messages(
+                        [
+                            EmailMessage(
+                                subject=email.subject,
+                                body=email.body,
+                                from_email=email.from_email,
+                                to=email.recipients,
+                                connection=connection,
+                            )
+                        ]
+                    )
+                except Exception as error:
+                    failed += 1
+                    _record_failure(email, error, max_attempts, now)
+                else:
+                    sent += 1
+                    email.attempts += 1
+                    email.status = OutboxEmail.Status.SENT
+                    email.sent_at = timezone.now()
+                    email.last_error = ""
+    finally:
+        connection.close()
+
+    OutboxEmail.objects.bulk_update(
+        emails,
+        ["status", "attempts", "next_attempt_at", "last_error", "sent_at"],
+    )
+    return sent, failed
@@ -0,0 +1,183 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from login.models import Choice, Question, Quiz
+from login.utils.analytics import create_stat_rows
+from login.utils.quiz_cache import invalidate_quiz_snapshots
+
+TRUE_VALUES = {"1", "true", "yes", "y", "t"}
+
+
+def _split(value):
+    return [item.strip() for item in value.split("|") if item.strip()]
+
+
+def read_csv(lines):
+    """
+    Yield question records from CSV rows.
+
+    Each row holds one choice: `question,choice,is_correct,quizzes`, where
+    `quizzes` is a `|` separated list of quiz names. Consecutive rows with
+    the same question text make up one question.
+    """
+    record = None
+    for line_number, row in enumerate(csv.DictReader(lines), start=2):
+        question = (row.get("question") or "").strip()
+        if record is None or question != record["text"]:
+            if record is not None:
+                yield record
+            record = {
+                "line": line_number,
+                "text": question,
+                "choices": [],
+                "quizzes": _split(row.get("quizzes") or ""),
+            }
+        record["choices"].append(
+            {
+                "text": (row.get("choice") or "").strip(),
+                "is_correct": (row.get("is_correct") or "").strip().lower()
+                in TRUE_VALUES,
+            }
+        )
+    if record is not None:
+        yield record
+
+
+def _check_type(value, expected, where, what):
+    if not isinstance(value, expected):
+        kind = {dict: "an object", list: "a list", bool: "true or false"}
+        raise ValidationError(
+            f"{where}: {what} must be {kind.get(expected, 'a string')}."
+        )
+    return value
+
+
+def read_jsonl(lines):
+    """
+    Yield question records from JSON lines of the form
+    `{"text": ..., "choices": [{"text": ..., "is_correct": ...}],
+    "quizzes": [...]}`.
+
+    Raises `ValidationError` naming the line if a line is not valid JSON
+    or a value has the wrong type.
+    """
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        where = f"Line {line_number}"
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as error:
+            raise ValidationError(f"{where}: {error}")
+        _check_type(data, dict, where, "the question")
+        choices = []
+        for choice in _check_type(
+            data.get("choices", []), list, where, "choices"
+        ):
+            _check_type(choice, dict, where, "a choice")
+            choices.append(
+                {
+                    "text": _check_type(
+                        choice.get("text", ""), str, where, "choice text"
+                    ).strip(),
+                    "is_correct": _check_type(
+                        choice.get("is_correct", False),
+                        bool,
+                        where,
+                        "is_correct",
+                    ),
+                }
+            )
+        yield {
+            "line": line_number,
+            "text": _check_type(
+                data.get("text", ""), str, where, "question text"
+            ).strip(),
+            "choices": choices,
+            "quizzes": [
+                _check_type(name, str, where, "a quiz name").strip()
+                for name in _check_type(
+                    data.get("quizzes", []), list, where, "quizzes"
+                )
+            ],
+        }
+
+
+def validate_records(records, quiz_ids):
+    """
+    Check each record and resolve its quiz names to ids.
+
+    `quiz_ids` maps quiz names to ids. Raises `ValidationError` on the
+    first invalid record.
+    """
+    for record in records:
+        where = f"Line {record['line']}"
+        if not record["text"]:
+            raise ValidationError(f"{where}: question text is required.")
+        if len(record["text"]) > Question._meta.get_field("text").max_length:
+            raise ValidationError(f"{where}: question text is too long.")
+        if len(record["choices"]) < 2:
+            raise ValidationError(f"{where}: at least two choices required.")
+        if any(not choice["text"] for choice in record["choices"]):
+            raise ValidationError(f"{where}: choice text is required.")
+        if not any(choice["is_correct"] for choice in record["choices"]):
+            raise ValidationError(f"{where}: no correct choice.")
+        unknown = set(record["quizzes"]) - set(quiz_ids)
+        if unknown:
+            raise ValidationError(
+                f"{where}: unknown quiz {', '.join(sorted(unknown))}."
+            )
+        record["quiz_ids"] = [quiz_ids[name] for name in record["quizzes"]]
+        yield record
+
+
+def chunked(records, size):
+    records = iter(records)
+    while chunk := list(islice(records, size)):
+        yield chunk
+
+
+def write_chunk(chunk):
+    """Insert one chunk of records with one bulk insert per table."""
+    QuizQuestion = Quiz.questions.through
+    with transaction.atomic():
+        questions = Question.objects.bulk_create(
+            Question(text=record["text"]) for record in chunk
+        )
+        Choice.objects.bulk_create(
+            Choice(question=question, **choice)
+            for question, record in zip(questions, chunk)
+            for choice in record["choices"]
+        )
+        QuizQuestion.objects.bulk_create(
+            QuizQuestion(quiz_id=quiz_id, question=question)
+            for question, record in zip(questions, chunk)
+            for quiz_id in record["quiz_ids"]
+        )
+
+
+def import_questions(records, chunk_size=1000, dry_run=False):
+    """
+    Validate and store question records, `chunk_size` questions at a time.
+
+    Bulk inserts do not send model signals, so no notification is sent
+    per question and the affected quiz snapshots are invalidated once at
+    the end. Returns the number of imported questions.
+    """
+    quiz_ids = dict(Quiz.objects.values_list("name", "id"))
+    touched_quizzes = set()
+    count = 0
+    for chunk in chunked(validate_records(records, quiz_ids), chunk_size):
+        if not dry_run:
+            write_chunk(chunk)
+        for record in chunk:
+            touched_quizzes.update(record["quiz_ids"])
+        count += len(chunk)
+    if not dry_run:
+        create_stat_rows(touched_quizzes)
+        invalidate_quiz_snapshots(touched_quizzes)
+    return count
@@ -0,0 +1,169 @@
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import cached_property
+
+from django.conf import settings
+from django.core.cache import cache
+
+from login.models import Choice, Quiz
+
+VERSION_KEY = "quiz-snapshot-version:{quiz_id}"
+
+
+@dataclass(frozen=True)
+class ChoiceSnapshot:
+    id: int
+    question_id: int
+    text: str
+    is_correct: bool
+
+
+@dataclass(frozen=True)
+class QuestionSnapshot:
+    id: int
+    text: str
+    choices: tuple
+
+    @cached_property
+    def correct_choice(self):
+        """Return the first correct choice, or None if there is none."""
+        return next((c for c in self.choices if c.is_correct), None)
+
+
+@dataclass(frozen=True)
+class QuizSnapshot:
+    """Immutable copy of a quiz, its questions and their choices."""
+
+    id: int
+    name: str
+    start_time: object
+    end_time: object
+    version: str
+    questions: tuple
+
+    @cached_property
+    def choices(self):
+        """Mapping of choice id to choice for every question of the quiz."""
+        return {
+            choice.id: choice
+            for question in self.questions
+            for choice in question.choices
+        }
+
+    @cached_property
+    def question_ids(self):
+        return frozenset(question.id for question in self.questions)
+
+
+class SnapshotLRU:
+    """Thread-safe, bounded LRU of quiz snapshots keyed by quiz id."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, quiz_id, version):
+        with self._lock:
+            snapshot = self._entries.get(quiz_id)
+            if snapshot is None or snapshot.version != version:
+                return None
+            self._entries.move_to_end(quiz_id)
+            return snapshot
+
+    def put(self, snapshot):
+        with self._lock:
+            self._entries[snapshot.id] = snapshot
+            self._entries.move_to_end(snapshot.id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, quiz_id):
+        with self._lock:
+            self._entries.pop(quiz_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+snapshots = SnapshotLRU(settings.QUIZ_SNAPSHOT_CACHE_SIZE)
+
+
+def _current_version(quiz_id):
+    """
+    Return the version token of a quiz, creating one if needed.
+
+    Versions live in the default cache, so an edit invalidates the
+    snapshots of every worker that shares that cache. With a per-process
+    cache such as LocMemCache, other workers keep serving their snapshot
+    until it is evicted.
+    """
+    key = VERSION_KEY.format(quiz_id=quiz_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def _build_snapshot(quiz_id, version):
+    quiz = Quiz.objects.get(id=quiz_id)
+
+    choices = {}
+    for choice in Choice.objects.filter(question__quizzes=quiz_id).order_by(
+        "id"
+    ):
+        choices.setdefault(choice.question_id, []).append(
+            ChoiceSnapshot(
+                id=choice.id,
+                question_id=choice.question_id,
+                text=choice.text,
+                is_correct=choice.is_correct,
+            )
+        )
+
+    questions = tuple(
+        QuestionSnapshot(
+            id=row.question.id,
+            text=row.question.text,
+            choices=tuple(choices.get(row.question.id, ())),
+        )
+        for row in Quiz.questions.through.objects.filter(quiz_id=quiz_id)
+        .select_related("question")
+        .order_by("id")
+    )
+
+    return QuizSnapshot(
+        id=quiz.id,
+        name=quiz.name,
+        start_time=quiz.start_time,
+        end_time=quiz.end_time,
+        version=version,
+        questions=questions,
+    )
+
+
+def get_quiz_snapshot(quiz_id) -> QuizSnapshot:
+    """
+    Return the snapshot of a quiz, building it on the first request for the
+    current quiz version.
+
+    Raises `Quiz.DoesNotExist` if the quiz does not exist.
+    """
+    quiz_id = int(quiz_id)
+    version = _current_version(quiz_id)
+    snapshot = snapshots.get(quiz_id, version)
+    if snapshot is None:
+        snapshot = _build_snapshot(quiz_id, version)
+        snapshots.put(snapshot)
+    return snapshot
+
+
+def invalidate_quiz_snapshots(quiz_ids):
+    """Start a new version for each of the given quizzes."""
+    for quiz_id in set(quiz_ids):
+        cache.set(VERSION_KEY.format(quiz_id=quiz_id), uuid.uuid4().hex, None)
+        snapshots.discard(quiz_id)
@@ -0,0 +1,163 @@
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Allowed/blocked decisions per limiter and cache fallbacks, for monitoring.
+limiter_stats = Counter()
+
+
+def client_ip(request):
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def hashed_key(value):
+    """Keep raw emails, usernames and addresses out of cache keys."""
+    return hashlib.sha256(str(value).lower().encode()).hexdigest()[:32]
+
+
+class TokenBucket:
+    """
+    Token bucket stored in the cache.
+
+    Each key starts with `capacity` tokens and regains one token every
+    `refill_seconds`. The read-modify-write is not atomic across workers,
+    so concurrent requests may occasionally get one extra token.
+    """
+
+    def __init__(self, name, capacity, refill_seconds):
+        self.name = name
+        self.capacity = capacity
+        self.refill_seconds = refill_seconds
+
+    def _key(self, value):
+        return f"bucket:{self.name}:{hashed_key(value)}"
+
+    def consume(self, value, now=None) -> bool:
+        """Take a token for `value`. Returns False if the bucket is empty."""
+        now = time.time() if now is None else now
+        key = self._key(value)
+        tokens, updated_at = cache.get(key, (self.capacity, now))
+        tokens = min(
+            self.capacity, tokens + (now - updated_at) / self.refill_seconds
+        )
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        cache.set(
+            key,
+            (tokens, now),
+            int(self.capacity * self.refill_seconds) + 1,
+        )
+        return allowed
+
+
+class LocalCounters:
+    """In-process stand-in for the cache when the cache is unavailable."""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                key: value
+                for key, (value, expires) in (
+                    (key, self._values.get(key, (0, 0))) for key in keys
+                )
+                if expires > now
+            }
+
+    def incr(self, key, timeout):
+        now = time.monotonic()
+        with self._lock:
+            value, expires = self._values.get(key, (0, 0))
+            if expires <= now:
+                value, expires = 0, now + timeout
+            self._values[key] = (value + 1, expires)
+            if len(self._values) > 10000:
+                self._values = {
+                    k: v for k, v in self._values.items() if v[1] > now
+                }
+            return value + 1
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._values.pop(key, None)
+
+
+class CacheCounters:
+    def get_many(self, keys):
+        return cache.get_many(keys)
+
+    def incr(self, key, timeout):
+        cache.add(key, 0, timeout)
+        return cache.incr(key)
+
+    def delete_many(self, keys):
+        cache.delete_many(keys)
+
+
+class SlidingWindowLimiter:
+    """
+    Sliding window counter: allows `limit` hits per `window` seconds.
+
+    The count is the hits of the current fixed window plus the hits of the
+    previous one weighted by how much of it still overlaps the sliding
+    window. Counters live in the cache; if the cache fails the limiter
+    keeps working on per-process counters.
+    """
+
+    def __init__(self, name, limit, window):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.counters = CacheCounters()
+        self.fallback = LocalCounters()
+
+    def _keys(self, value, now):
+        index = math.floor(now / self.window)
+        prefix = f"window:{self.name}:{hashed_key(value)}"
+        return f"{prefix}:{index - 1}", f"{prefix}:{index}"
+
+    def _call(self, method, *args):
+        try:
+            return getattr(self.counters, method)(*args)
+        except Exception:
+            limiter_stats["cache_fallback"] += 1
+            logger.warning("Rate limiter %s: cache unavailable", self.name)
+            return getattr(self.fallback, method)(*args)
+
+    def count(self, value, now=None):
+        now = time.time() if now is None else now
+        previous_key, current_key = self._keys(value, now)
+        counts = self._call("get_many", [previous_key, current_key])
+        overlap = 1 - (now % self.window) / self.window
+        return counts.get(current_key, 0) + counts.get(previous_key, 0) * (
+            overlap
+        )
+
+    def is_limited(self, value, now=None) -> bool:
+        limited = self.count(value, now) >= self.limit
+        limiter_stats[
+            f"{self.name}.{'blocked' if limited else 'allowed'}"
+        ] += 1
+        return limited
+
+    def hit(self, value, now=None):
+        now = time.time() if now is None else now
+        _, current_key = self._keys(value, now)
+        self._call("incr", current_key, self.window * 2)
+
+    def reset(self, value, now=None):
+        now = time.time() if now is None else now
+        self._call("delete_many", list(self._keys(value, now)))
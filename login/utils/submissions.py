@@ -0,0 +1,102 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from login.models import Answer, QuizSubmission
+from login.utils.grading import enqueue_grading
+
+ANSWER_FIELD_PREFIX = "question_"
+
+
+def parse_answers(raw_answers):
+    """
+    Convert form data (`question_<id>` -> choice id) into a mapping of
+    question id to choice id.
+    """
+    answers = {}
+    for field, choice_id in raw_answers.items():
+        if not field.startswith(ANSWER_FIELD_PREFIX):
+            continue
+        try:
+            question_id = int(field[len(ANSWER_FIELD_PREFIX) :])
+            answers[question_id] = int(choice_id)
+        except (TypeError, ValueError):
+            raise ValidationError("Invalid answer data.")
+    return answers
+
+
+def validate_page_answers(snapshot, answers):
+    """
+    Check that each answered question belongs to the quiz and each chosen
+    choice to its question, using the quiz snapshot only.
+    """
+    for question_id, choice_id in answers.items():
+        choice = snapshot.choices.get(choice_id)
+        if question_id not in snapshot.question_ids or (
+            choice is None or choice.question_id != question_id
+        ):
+            raise ValidationError("Invalid answer data.")
+
+
+def get_draft(user, quiz_id):
+    """Return the user's submission for a quiz, or None."""
+    return QuizSubmission.objects.filter(user=user, quiz_id=quiz_id).first()
+
+
+def save_draft_answers(user, snapshot, answers) -> QuizSubmission:
+    """
+    Upsert the answers of one quiz page into the user's draft submission.
+
+    Each page writes only its own rows, so answers survive worker restarts
+    and the final submit does not have to insert them all at once.
+    Raises `ValidationError` if the answers do not match the quiz or the
+    quiz was already submitted.
+    """
+    validate_page_answers(snapshot, answers)
+    draft, _ = QuizSubmission.objects.get_or_create(
+        user=user, quiz_id=snapshot.id
+    )
+    if draft.status != QuizSubmission.Status.DRAFT:
+        raise ValidationError("You have already submitted this quiz.")
+
+    Answer.objects.bulk_create(
+        [
+            Answer(
+                submission=draft,
+                question_id=question_id,
+                answer_choice_id=choice_id,
+            )
+            for question_id, choice_id in answers.items()
+        ],
+        update_conflicts=True,
+        unique_fields=["submission", "question"],
+        update_fields=["answer_choice", "submitted_at"],
+    )
+    return draft
+
+
+def load_draft_answers(draft, questions):
+    """Return the saved answers of a draft for the given questions."""
+    if draft is None:
+        return {}
+    return dict(
+        draft.answers.filter(
+            question_id__in=[question.id for question in questions]
+        ).values_list("question_id", "answer_choice_id")
+    )
+
+
+def submit_draft(draft, snapshot):
+    """
+    Turn a complete draft into a submission and queue it for grading.
+
+    Raises `ValidationError` if a question of the quiz is still unanswered.
+    """
+    with transaction.atomic():
+        answered = draft.answers.filter(question__quizzes=snapshot.id).count()
+        if answered != len(snapshot.questions):
+            raise ValidationError("Please answer every question of the quiz.")
+        submitted = QuizSubmission.objects.filter(
+            pk=draft.pk, status=QuizSubmission.Status.DRAFT
+        ).update(status=QuizSubmission.Status.SUBMITTED)
+        if submitted:
+            enqueue_grading(draft)
@@ -0,0 +1,332 @@
+import datetime
+import math
+import random
+from collections import Counter
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from login.models import (
+    Answer,
+    Choice,
+    Question,
+    Quiz,
+    QuizResult,
+    QuizSubmission,
+)
+from login.signals import bulk_operation
+from login.utils.analytics import create_stat_rows, rebuild_quiz_stats
+from login.utils.grading import build_outcomes
+from login.utils.quiz_cache import get_quiz_snapshot
+from mysite.cache import bump_generation
+from polls.models import Choice as PollChoice
+from polls.models import Question as PollQuestion
+from polls.signals import INDEX_NAMESPACE
+
+SYNTHETIC_PASSWORD = "synthetic-password"
+
+
+def _rng(seed, stage):
+    """
+    A generator per stage, so changing the size of one stage does not
+    change the data generated by the others.
+    """
+    return random.Random(f"{seed}:{stage}")
+
+
+def generate_users(count, seed, prefix="synthetic", chunk_size=5000):
+    """
+    Create `count` users sharing one password hash and return their ids
+    with an ability score used to decide how well they answer.
+    """
+    rng = _rng(seed, "users")
+    password = make_password(SYNTHETIC_PASSWORD)
+    users = User.objects.bulk_create(
+        (
+            User(username=f"{prefix}{i}", password=password)
+            for i in range(count)
+        ),
+        batch_size=chunk_size,
+    )
+    return {user.id: rng.gauss(0.5, 1) for user in users}
+
+
+def generate_quizzes(count, questions, choices, seed, days=30):
+    """
+    Create quizzes of their own `questions` questions with `choices`
+    choices each, one of them correct, and return the quizzes.
+
+    Quizzes start at random times over the last `days` days and each
+    question gets a difficulty and uneven weights for its wrong choices.
+    """
+    rng = _rng(seed, "quizzes")
+    now = timezone.now()
+    created = []
+    for number in range(count):
+        start_time = now - datetime.timedelta(days=rng.uniform(0, days))
+        quiz = Quiz.objects.create(
+            name=f"Synthetic quiz {number}",
+            start_time=start_time,
+            end_time=start_time
+            + datetime.timedelta(hours=rng.randint(1, 7 * 24)),
+        )
+        quiz_questions = Question.objects.bulk_create(
+            Question(text=f"Synthetic question {number}.{i}")
+            for i in range(questions)
+        )
+        correct = {
+            question.id: rng.randrange(choices) for question in quiz_questions
+        }
+        Choice.objects.bulk_create(
+            Choice(
+                question=question,
+                text=f"Choice {j}",
+                is_correct=j == correct[question.id],
+            )
+            for question in quiz_questions
+            for j in range(choices)
+        )
+        Quiz.questions.through.objects.bulk_create(
+            Quiz.questions.through(quiz_id=quiz.id, question_id=question.id)
+            for question in quiz_questions
+        )
+        created.append(quiz)
+    create_stat_rows(quiz.id for quiz in created)
+    return created
+
+
+def _insert_rows(model, fields, rows):
+    """
+    Insert tuples of `fields` values straight through the cursor. Building
+    a model instance per row would cost more than the insert itself.
+    """
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    columns = ", ".join(quote(model._meta.get_field(f).column) for f in fields)
+    sql = (
+        f"INSERT INTO {quote(model._meta.db_table)} ({columns}) "
+        f"VALUES ({', '.join(['%s'] * len(fields))})"
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def _answer_model(quiz, rng):
+    """
+    Return (question id, difficulty, correct choice id, wrong choice ids,
+    cumulative wrong choice weights) for every question of `quiz`.
+    """
+    model = []
+    for question in get_quiz_snapshot(quiz.id).questions:
+        correct = question.correct_choice
+        wrong = [c.id for c in question.choices if c is not correct]
+        weights = list(accumulate(rng.random() ** 2 + 0.01 for _ in wrong))
+        model.append(
+            (question.id, rng.gauss(0, 1), correct.id, wrong, weights)
+        )
+    return model
+
+
+def generate_submissions(
+    quiz,
+    abilities,
+    seed,
+    participation=0.5,
+    draft_rate=0.05,
+    grade=False,
+    chunk_size=5000,
+):
+    """
+    Create the submissions and answers of a share of the users for `quiz`.
+
+    A user starts the quiz while it is open and takes up to an hour to
+    finish it. They answer a question correctly with a probability that
+    grows with their ability and falls with the question's difficulty;
+    wrong answers favour some choices over others. About `draft_rate` of
+    the submissions are drafts that stop partway through. With `grade`,
+    submitted ones also get their `QuizResult`. Returns a Counter of the
+    created rows.
+    """
+    rng = _rng(seed, quiz.name)
+    model = _answer_model(quiz, rng)
+    share = min(max(rng.uniform(0.5, 1.5) * participation, 0), 1)
+    user_ids = rng.sample(sorted(abilities), round(len(abilities) * share))
+    snapshot = get_quiz_snapshot(quiz.id) if grade else None
+    connection = connections[router.db_for_write(Answer)]
+    latest = min(quiz.end_time, timezone.now())
+    window = max((latest - quiz.start_time).total_seconds(), 0)
+    created = Counter()
+
+    # Submissions per transaction, so each one inserts about `chunk_size`
+    # answers.
+    per_chunk = max(chunk_size // len(model), 1)
+    for start in range(0, len(user_ids), per_chunk):
+        chunk = user_ids[start : start + per_chunk]
+        submissions, started = [], []
+        for user_id in chunk:
+            started_at = quiz.start_time + datetime.timedelta(
+                seconds=rng.uniform(0, window)
+            )
+            if rng.random() < draft_rate:
+                status, completed_at = QuizSubmission.Status.DRAFT, None
+            else:
+                status = QuizSubmission.Status.SUBMITTED
+                completed_at = min(
+                    started_at
+                    + datetime.timedelta(seconds=rng.uniform(60, 3600)),
+                    latest,
+                )
+            started.append(started_at)
+            submissions.append(
+                QuizSubmission(
+                    user_id=user_id,
+                    quiz_id=quiz.id,
+                    status=status,
+                    completed_at=completed_at,
+                )
+            )
+
+        answers, results = [], []
+        with transaction.atomic():
+            QuizSubmission.objects.bulk_create(submissions)
+            # `started_at` is set to the current time on insert.
+            for submission, started_at in zip(submissions, started):
+                submission.started_at = started_at
+            QuizSubmission.objects.bulk_update(submissions, ["started_at"])
+            for submission in submissions:
+                ability = abilities[submission.user_id]
+                submitted_at = connection.ops.adapt_datetimefield_value(
+                    submission.completed_at or submission.started_at
+                )
+                answered = model
+                if submission.completed_at is None:
+                    answered = model[: rng.randrange(len(model))]
+                selected = {}
+                for (
+                    question_id,
+                    difficulty,
+                    correct,
+                    wrong,
+                    weights,
+                ) in answered:
+                    chance = 1 / (1 + math.exp(difficulty - ability))
+                    if rng.random() < chance:
+                        choice_id = correct
+                    else:
+                        choice_id = rng.choices(wrong, cum_weights=weights)[0]
+                    selected[question_id] = choice_id
+                    answers.append(
+                        (submission.id, question_id, choice_id, submitted_at)
+                    )
+                if grade and submission.completed_at is not None:
+                    correct_count, outcomes = build_outcomes(
+                        snapshot, selected
+                    )
+                    results.append(
+                        QuizResult(
+                            submission_id=submission.id,
+                            score=round(correct_count / len(model) * 100, 2),
+                            correct_count=correct_count,
+                            total=len(model),
+                            outcomes=outcomes,
+                        )
+                    )
+            _insert_rows(
+                Answer,
+                ("submission", "question", "answer_choice", "submitted_at"),
+                answers,
+            )
+            QuizResult.objects.bulk_create(results, batch_size=chunk_size)
+
+        created["submissions"] += len(submissions)
+        created["answers"] += len(answers)
+        created["results"] += len(results)
+
+    if grade:
+        rebuild_quiz_stats(snapshot)
+    return created
+
+
+def generate_polls(count, choices, votes, seed, days=30):
+    """
+    Create `count` poll questions published over the last `days` days and
+    spread `votes` votes over them.
+
+    A few polls get most of the votes, and within a poll the votes are
+    split by random weights.
+    """
+    rng = _rng(seed, "polls")
+    now = timezone.now()
+    polls = PollQuestion.objects.bulk_create(
+        PollQuestion(
+            question_text=f"Synthetic poll {number}",
+            pub_date=now - datetime.timedelta(days=rng.uniform(0, days)),
+        )
+        for number in range(count)
+    )
+    # Zipf-like popularity: the poll ranked r gets about 1/r of the votes.
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    popularity = [1 / rank for rank in ranks]
+    total_popularity = sum(popularity)
+
+    poll_choices = []
+    for poll, weight in zip(polls, popularity):
+        poll_votes = round(votes * weight / total_popularity)
+        shares = [rng.gammavariate(1, 1) for _ in range(choices)]
+        total_shares = sum(shares)
+        for number, share in enumerate(shares):
+            poll_choices.append(
+                PollChoice(
+                    question=poll,
+                    choice_text=f"Choice {number}",
+                    votes=round(poll_votes * share / total_shares),
+                )
+            )
+    PollChoice.objects.bulk_create(poll_choices)
+    bump_generation(INDEX_NAMESPACE)
+    return Counter(polls=len(polls), poll_choices=len(poll_choices))
+
+
+def generate_dataset(
+    seed=0,
+    users=1000,
+    quizzes=10,
+    questions=20,
+    choices=4,
+    participation=0.5,
+    draft_rate=0.05,
+    grade=False,
+    polls=50,
+    poll_choices=4,
+    votes=100000,
+    prefix="synthetic",
+    chunk_size=5000,
+):
+    """
+    Fill the database with a deterministic synthetic dataset and return a
+    Counter of the created rows.
+
+    Rows are inserted with chunked `bulk_create` inside `bulk_operation()`,
+    so no welcome emails are queued and caches are invalidated once.
+    """
+    created = Counter()
+    with bulk_operation():
+        abilities = generate_users(users, seed, prefix, chunk_size)
+        created["users"] = len(abilities)
+        for quiz in generate_quizzes(quizzes, questions, choices, seed):
+            created["quizzes"] += 1
+            created += generate_submissions(
+                quiz,
+                abilities,
+                seed,
+                participation=participation,
+                draft_rate=draft_rate,
+                grade=grade,
+                chunk_size=chunk_size,
+            )
+        created += generate_polls(polls, poll_choices, votes, seed)
+    return created
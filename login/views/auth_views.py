@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
@@ -16,12 +17,28 @@ from django.views.decorators.cache import never_cache
 
 from ..forms import EmailForm, LoginForm, RegistrationForm
 from ..utils.email_utils import send_verification_otp_email
+from ..utils.otp import OTPRateLimited, consume_otp, match_otp
+from ..utils.rate_limit import SlidingWindowLimiter, client_ip
+
+login_ip_limiter = SlidingWindowLimiter("login-ip", *settings.LOGIN_IP_RATE)
+login_username_limiter = SlidingWindowLimiter(
+    "login-username", *settings.LOGIN_USERNAME_RATE
+)
+
+
+def login_throttled(ip, username):
+    if login_ip_limiter.is_limited(ip):
+        return True
+    return login_username_limiter.is_limited(username)
 
 
 @method_decorator(never_cache, name="post")
 class LoginView(View):
     def get(self, request) -> HttpResponse:
-        request.session.flush()
+        # Only flush existing sessions; flushing an empty one still costs a
+        # session-table write.
+        if request.session.session_key is not None:
+            request.session.flush()
         return render(request, "login/login.html", {"form": LoginForm()})
 
     def post(
@@ -31,12 +48,24 @@ class LoginView(View):
         if form.is_valid():
             username = request.POST.get("username")
             password = request.POST.get("password")
+
+            # Refuse throttled attempts before paying for a password hash.
+            ip = client_ip(request)
+            if login_throttled(ip, username):
+                messages.error(
+                    request, "Too many login attempts. Please try again later."
+                )
+                return redirect("login:login")
+            login_ip_limiter.hit(ip)
+
             user = authenticate(request, username=username, password=password)
 
             if user is not None:
+                login_username_limiter.reset(username)
                 login(request, user)
                 return redirect(reverse("login:dashboard"))
             else:
+                login_username_limiter.hit(username)
                 messages.error(request, "Invalid username or password.")
                 return redirect("login:login")
         else:
@@ -67,13 +96,17 @@ class RegisterView(View):
                 messages.error(request, "Invalid email address.")
                 return redirect("login:register")
 
-            if send_verification_otp_email(email, request):
-                request.session["email"] = email
-                messages.success(request, "OTP sent to your email.")
-                return redirect(reverse("login:register"))
+            try:
+                send_verification_otp_email(email, request)
+            except OTPRateLimited:
+                messages.error(
+                    request, "Too many OTP requests. Please try again later."
+                )
+                return redirect("login:register")
 
-            messages.error(request, "Failed to send OTP.")
-            return redirect("login:register")
+            request.session["email"] = email
+            messages.success(request, "OTP sent to your email.")
+            return redirect(reverse("login:register"))
 
         else:
             return user_registration(request)
@@ -97,8 +130,7 @@ def user_registration(
     username = request.POST.get("username")
     email = request.session.get("email")
     otp = request.POST.get("otp")
-    session_otp = request.session.get("otp")
-    if not session_otp or otp != session_otp:
+    if not match_otp("register", email, otp):
         messages.error(request, "Invalid OTP.")
         return redirect("login:register")
 
@@ -108,6 +140,11 @@ def user_registration(
         if User.objects.filter(username=username).exists():
             messages.error(request, "Username already exists.")
             return redirect("login:register")
+        # The OTP is only used up once the rest of the form is valid, so a
+        # typo can be corrected without requesting a new one.
+        if not consume_otp("register", email):
+            messages.error(request, "Invalid OTP.")
+            return redirect("login:register")
         user = User.objects.create_user(
             username=username, password=password, email=email
         )
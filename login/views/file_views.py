@@ -1,18 +1,131 @@
+import re
+
+from django.conf import settings
 from django.contrib import messages
-from django.shortcuts import render
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import ValidationError
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import redirect, render
+from django.urls import reverse
 
 from ..forms import FileUploadForm
-from ..utils.file_utils import handle_uploaded_file
+from ..models import Upload
+from ..utils.file_utils import StoredFile, handle_uploaded_file
+
+BYTE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+LINE_RANGE = re.compile(r"^(\d+)-(\d+)$")
 
 
+@login_required(login_url='login:login')
 def file_upload(request):
     if request.method == 'POST':
         form = FileUploadForm(request.POST, request.FILES)
         if form.is_valid():
-            data = handle_uploaded_file(request.FILES['file'])
-            return render(request, 'login/view_file.html', {'data': data})
+            try:
+                digest = handle_uploaded_file(
+                    request.FILES['file'], request.user
+                )
+            except ValidationError as error:
+                messages.error(request, error.message)
+            else:
+                return redirect('login:view_file', digest=digest)
         else:
             messages.error(request, 'Invalid form submission. Try again.')
     else:
         form = FileUploadForm()
     return render(request, 'login/file_upload.html', {'form': form})
+
+
+def _byte_range(header, size):
+    """
+    Return the (start, end) of a single `bytes=` range, empty if it cannot
+    be satisfied, or None if the header is not one well-formed range and
+    must be ignored.
+    """
+    match = BYTE_RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if first == '':
+        start, end = max(size - int(last), 0), size
+    elif last and int(last) < int(first):
+        return None
+    else:
+        start = int(first)
+        end = min(int(last) + 1, size) if last else size
+    return start, end
+
+
+def _range_response(stored, byte_range):
+    start, end = byte_range
+    if start >= end:
+        stored.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stored.size}'
+        return response
+    response = StreamingHttpResponse(
+        stored.iter_range(start, end),
+        status=206,
+        content_type='text/plain; charset=utf-8',
+    )
+    response['Content-Range'] = f'bytes {start}-{end - 1}/{stored.size}'
+    response['Content-Length'] = end - start
+    return response
+
+
+def _lines_response(request, stored):
+    page_lines = settings.FILE_VIEW_PAGE_LINES
+    num_pages = max(-(-stored.total_lines // page_lines), 1)
+    match = LINE_RANGE.match(request.GET.get('lines', ''))
+    if match:
+        first = int(match.group(1))
+        count = max(int(match.group(2)) - first + 1, 0)
+        page = None
+    else:
+        try:
+            page = int(request.GET.get('page', 1))
+        except ValueError:
+            page = 1
+        page = min(max(page, 1), num_pages)
+        first, count = (page - 1) * page_lines, page_lines
+
+    start, end = stored.line_range(first, count)
+    response = StreamingHttpResponse(
+        stored.iter_range(start, end),
+        content_type='text/plain; charset=utf-8',
+    )
+    last = max(min(first + count, stored.total_lines) - 1, first)
+    response['X-Lines'] = f'{first}-{last}/{stored.total_lines}'
+    if page is not None:
+        url = reverse('login:view_file', args=(stored.digest,))
+        links = []
+        if page > 1:
+            links.append(f'<{url}?page={page - 1}>; rel="prev"')
+        if page < num_pages:
+            links.append(f'<{url}?page={page + 1}>; rel="next"')
+        if links:
+            response['Link'] = ', '.join(links)
+    return response
+
+
+@login_required(login_url='login:login')
+def view_file(request, digest):
+    """
+    Serve part of a file the user uploaded as plain text: a byte range
+    when the request has a Range header, else a page (`?page=`) or a range
+    of lines (`?lines=first-last`, 0-based).
+    """
+    if not Upload.objects.filter(user=request.user, digest=digest).exists():
+        raise Http404('File not found.')
+    try:
+        stored = StoredFile(digest)
+    except FileNotFoundError:
+        raise Http404('File not found.')
+
+    byte_range = _byte_range(request.META.get('HTTP_RANGE', ''), stored.size)
+    if byte_range is not None:
+        response = _range_response(stored, byte_range)
+    else:
+        response = _lines_response(request, stored)
+    response['Accept-Ranges'] = 'bytes'
+    return response
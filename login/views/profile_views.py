@@ -9,18 +9,21 @@ from django.views.decorators.cache import never_cache
 
 from ..forms import PasswordResetForm, ProfileUpdateForm, UsernameForm
 from ..utils.email_utils import generate_otp, send_email_to_user
+from ..utils.otp import OTPRateLimited, consume_otp, issue_otp, match_otp
+from ..utils.rate_limit import client_ip
 
 
 @login_required(login_url="login:login")
 @never_cache
-def dashboard(request):
-    return render(request, "login/dashboard.html")
+async def dashboard(request):
+    user = await request.auser()
+    return render(request, "login/dashboard.html", {"user": user})
 
 
 @login_required(login_url="login:login")
 @never_cache
-def profile(request):
-    user = request.user
+async def profile(request):
+    user = await request.auser()
     return render(request, "login/profile.html", {"user": user})
 
 
@@ -67,18 +70,21 @@ def reset_password(request):
             print(f"User email: {user_email}")
 
             otp = generate_otp()
-            status = send_email_to_user(
+            try:
+                issue_otp("reset", user_email, client_ip(request), otp)
+            except OTPRateLimited:
+                messages.error(
+                    request, "Too many OTP requests. Please try again later."
+                )
+                return redirect(reverse("login:reset_password"))
+            send_email_to_user(
                 "Password Reset OTP",
                 f"Your OTP for password reset is: {otp}",
                 [user_email],
             )
-            if status:
-                request.session["otp"] = otp
-                request.session["email_otp_sent"] = True
-                messages.success(request, f"OTP sent to {user_email}.")
-                return redirect(reverse("login:reset_password"))
-            else:
-                messages.error(request, "Failed to send email.")
+            request.session["email_otp_sent"] = True
+            messages.success(request, f"OTP sent to {user_email}.")
+            return redirect(reverse("login:reset_password"))
         else:
             messages.error(request, "Invalid form submission.")
     else:
@@ -94,16 +100,19 @@ def verify_otp(request):
     if request.method != "POST":
         return redirect("login:reset_password")
 
+    user = get_object_or_404(User, username=request.session.get("user"))
+
     otp = request.POST.get("otp")
-    if otp != request.session.get("otp"):
+    if not match_otp("reset", user.email, otp):
         messages.error(request, "Invalid OTP.")
         return redirect("login:reset_password")
 
-    user = get_object_or_404(User, username=request.session.get("user"))
-
     new_password = request.POST.get("new_password")
     confirm_password = request.POST.get("confirm_password")
     if new_password == confirm_password:
+        if not consume_otp("reset", user.email):
+            messages.error(request, "Invalid OTP.")
+            return redirect("login:reset_password")
         user.set_password(new_password)
         user.save()
 
@@ -1,27 +1,61 @@
+import math
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib import messages
-from django.contrib.auth.decorators import login_required
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.exceptions import ValidationError
 from django.core.paginator import Paginator
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import redirect, render
 from django.utils.decorators import method_decorator
 from django.views import View
 from django.views.decorators.cache import never_cache
 
 from login.forms import QuestionForm
-from login.models import Answer, Choice, Question, Quiz, QuizSubmission
+from login.models import GradingJob, Quiz, QuizResult, QuizSubmission
+from login.signals import QUIZ_LIST_NAMESPACE
+from login.utils.analytics import quiz_analytics
+from login.utils.export import EXPORT_FORMATS, iter_answer_rows
+from login.utils.grading import enqueue_grading
+from login.utils.quiz_cache import get_quiz_snapshot
+from login.utils.submissions import (
+    get_draft,
+    load_draft_answers,
+    parse_answers,
+    save_draft_answers,
+    submit_draft,
+)
+from mysite.cache import aget_or_build, ageneration
+
+QUIZZES_PER_PAGE = 20
 
 
 @method_decorator([login_required], name="dispatch")
 class Questions(View):
+    def _get_snapshot(self, quiz_id):
+        """Helper method to return the quiz snapshot or raise 404"""
+        try:
+            return get_quiz_snapshot(quiz_id)
+        except Quiz.DoesNotExist:
+            raise Http404("Quiz not found.")
+
     def _get_paginated_questions(self, page_number, quiz_id):
         """Helper method to set up paginator and return page object"""
-        questions = Quiz.objects.get(id=quiz_id).questions.all()
-        self.paginator = Paginator(questions, 2)
+        snapshot = self._get_snapshot(quiz_id)
+        self.paginator = Paginator(snapshot.questions, 2)
         return self.paginator.get_page(page_number)
 
-    def _render_questions(self, request, page_obj, quiz_id, form=None):
+    def _render_questions(self, request, page_obj, quiz_id, draft=None):
         """Helper method to render the questions template"""
-        if form is None:
-            form = QuestionForm(questions=page_obj.object_list)
+        saved_answers = load_draft_answers(draft, page_obj.object_list)
+        form = QuestionForm(
+            questions=page_obj.object_list,
+            initial={
+                f"question_{question_id}": choice_id
+                for question_id, choice_id in saved_answers.items()
+            },
+        )
 
         return render(
             request,
@@ -36,122 +70,157 @@ class Questions(View):
     def get(self, request, quiz_id):
         page_number = request.GET.get("page", 1)
         page_obj = self._get_paginated_questions(page_number, quiz_id)
-        if not page_obj.object_list:
+        draft = get_draft(request.user, quiz_id)
+        if not page_obj.object_list or (
+            draft and draft.status != QuizSubmission.Status.DRAFT
+        ):
             messages.info(
                 request,
                 "No questions available \
                 or you have already answered all questions.",
             )
             return redirect("login:dashboard")
-        request.session["answers"] = {}
-        return self._render_questions(request, page_obj, quiz_id)
+        return self._render_questions(request, page_obj, quiz_id, draft)
 
     def post(self, request, quiz_id):
-        # Store current page answers in session
-        if "answers" not in request.session:
-            request.session["answers"] = {}
-
-        # Update session with current page answers
-        current_answers = {
-            k: v for k, v in request.POST.items() if k.startswith("question")
-        }
-        request.session["answers"].update(current_answers)
-        request.session.modified = True
-
-        if len(request.session["answers"]) == len(Question.objects.all()):
-            submission = QuizSubmission.objects.create(
-                user=request.user,
-                quiz_id=quiz_id,
+        snapshot = self._get_snapshot(quiz_id)
+        try:
+            # Every page is saved as it is submitted, so the final submit
+            # only has to flip the draft's status.
+            draft = save_draft_answers(
+                request.user, snapshot, parse_answers(request.POST)
             )
-            Answer.objects.bulk_create(
-                Answer(
-                    submission=submission,
-                    question=Question.objects.get(
-                        id=int(q_id.replace("question_", ""))
-                    ),
-                    answer_choice=Choice.objects.get(
-                        id=int(choice_id.replace("question_", ""))
-                    ),
-                )
-                for q_id, choice_id in request.session["answers"].items()
+            if "submitted" in request.POST:
+                submit_draft(draft, snapshot)
+        except ValidationError as error:
+            messages.error(request, error.message)
+            return redirect("login:questions", quiz_id=quiz_id)
+
+        if "submitted" in request.POST:
+            messages.success(
+                request, "Your answers have been submitted for grading."
             )
-            request.session.pop("answers", None)
             return redirect("login:dashboard")
 
         # Initialize paginator for POST requests
         page_number = request.POST.get("page", 1)
         page_obj = self._get_paginated_questions(page_number, quiz_id)
-
-        # Initialize form with the current page's questions
-        form = QuestionForm(questions=page_obj.object_list)
-        return self._render_questions(request, page_obj, quiz_id, form)
+        return self._render_questions(request, page_obj, quiz_id, draft)
 
 
 @login_required(login_url="login:login")
 @never_cache
-def result(request, quiz_id):
+async def result(request, quiz_id):
     if request.method != "GET":
         return redirect("login:dashboard")
 
-    total = 0
-    correct_count = 0
-    results = []
-
-    correct_answers = {
-        choice.question.id: choice.id
-        for choice in Choice.objects.filter(is_correct=True)
-    }
-
-    quiz = Quiz.objects.get(id=quiz_id)
-    questions = quiz.questions.all()
-
-    submission = QuizSubmission.objects.get(user=request.user, quiz=quiz)
-    for question in questions:
-        selected_choice_id = (
-            submission.answers.filter(question=question)
-            .values_list("answer_choice", flat=True)
-            .first()
+    user = await request.auser()
+    submission = (
+        await QuizSubmission.objects.filter(
+            user=user,
+            quiz_id=quiz_id,
+            status=QuizSubmission.Status.SUBMITTED,
         )
-        try:
-            selected_choice = Choice.objects.get(id=selected_choice_id)
-            correct_choice_id = correct_answers.get(question.id)
-
-            is_correct = selected_choice.id == correct_choice_id
-            if is_correct:
-                correct_count += 1
-
-            total += 1
-            results.append(
-                {
-                    "question": question.text,
-                    "selected_choice": selected_choice.text,
-                    "correct_answer": Choice.objects.get(
-                        id=correct_choice_id
-                    ).text,
-                    "is_correct": is_correct,
-                }
-            )
-
-        except (Choice.DoesNotExist, KeyError):
-            messages.error(request, "Invalid or missing answer data.")
-            return redirect("login:questions")
+        .select_related("result")
+        .order_by("-started_at")
+        .afirst()
+    )
+    if submission is None:
+        messages.error(request, "You have not taken this quiz yet.")
+        return redirect("login:dashboard")
 
-    score = (correct_count / total) * 100 if total > 0 else 0
+    try:
+        quiz_result = submission.result
+    except QuizResult.DoesNotExist:
+        # Submissions made before the grading queue existed are queued here.
+        job = await sync_to_async(enqueue_grading)(submission)
+        if job.status == GradingJob.Status.FAILED:
+            messages.error(
+                request,
+                "Your submission could not be graded. It will be graded "
+                "again once the problem is fixed.",
+            )
+            return redirect("login:dashboard")
+        messages.info(
+            request,
+            "Your submission is being graded. Please check back shortly.",
+        )
+        return redirect("login:dashboard")
 
     return render(
         request,
         "login/result.html",
         {
-            "score": round(score, 2),
-            "total": total,
-            "correct_count": correct_count,
-            "results": results,
+            "score": quiz_result.score,
+            "total": quiz_result.total,
+            "correct_count": quiz_result.correct_count,
+            "results": quiz_result.outcomes,
+            "user": user,
         },
     )
 
 
+async def _build_quiz_page(page_number):
+    quizzes = Quiz.objects.order_by("-created_at", "-id").values(
+        "id", "name", "start_time", "end_time"
+    )
+    num_pages = max(math.ceil(await quizzes.acount() / QUIZZES_PER_PAGE), 1)
+    number = min(page_number, num_pages)
+    start = (number - 1) * QUIZZES_PER_PAGE
+    return {
+        "quizzes": [
+            quiz async for quiz in quizzes[start : start + QUIZZES_PER_PAGE]
+        ],
+        "number": number,
+        "num_pages": num_pages,
+    }
+
+
 @login_required(login_url="login:login")
-def quiz_list(request):
+async def quiz_list(request):
     """View to list all quizzes"""
-    quizzes = Quiz.objects.all().order_by("-created_at")
-    return render(request, "login/quiz_list.html", {"quizzes": quizzes})
+    try:
+        page_number = max(int(request.GET.get("page", 1)), 1)
+    except ValueError:
+        page_number = 1
+    page = await aget_or_build(
+        f"quiz-list:{await ageneration(QUIZ_LIST_NAMESPACE)}:{page_number}",
+        lambda: _build_quiz_page(page_number),
+        settings.PAGE_CACHE_TIMEOUT,
+    )
+    user = await request.auser()
+    return render(request, "login/quiz_list.html", {**page, "user": user})
+
+
+@user_passes_test(lambda user: user.is_staff, login_url="login:login")
+@never_cache
+def analytics(request, quiz_id):
+    """View to show the item analysis of a quiz to instructors"""
+    try:
+        snapshot = get_quiz_snapshot(quiz_id)
+    except Quiz.DoesNotExist:
+        raise Http404("Quiz not found.")
+    return render(
+        request,
+        "login/quiz_analytics.html",
+        {"quiz": snapshot, "questions": quiz_analytics(snapshot)},
+    )
+
+
+@user_passes_test(lambda user: user.is_staff, login_url="login:login")
+def export_submissions(request, quiz_id):
+    """View to stream the submissions and answers of a quiz"""
+    export_format = request.GET.get("format", "csv")
+    if export_format not in EXPORT_FORMATS:
+        raise Http404("Unknown export format.")
+    if not Quiz.objects.filter(id=quiz_id).exists():
+        raise Http404("Quiz not found.")
+
+    serialize, content_type = EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(
+        serialize(iter_answer_rows(quiz_id)), content_type=content_type
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="quiz_{quiz_id}_answers.{export_format}"'
+    )
+    return response
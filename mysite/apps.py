@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class MysiteConfig(AppConfig):
+    """Project-wide hooks that do not belong to any one app."""
+
+    name = "mysite"
+
+    def ready(self):
+        import mysite.db  # noqa: F401
+        import mysite.profiling  # noqa: F401
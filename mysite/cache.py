@@ -0,0 +1,297 @@
+"""
+Two-tier cache: a small per-process LRU in front of a shared backend.
+
+Reads are served from the in-process tier when possible and fall back to
+the shared backend (any other alias in ``CACHES``, e.g. a database cache).
+Writes always go to the shared backend and evict the local copy, so other
+processes see a change at most ``L1_TIMEOUT`` seconds late.
+"""
+
+import asyncio
+import pickle
+import threading
+import time
+import uuid
+import weakref
+import zlib
+from collections import Counter, OrderedDict
+
+from django.core.cache import cache as default_cache
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.db import transaction
+
+MISSING = object()
+
+# Hits and misses of the tiered caches of this process.
+cache_stats = Counter()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._shared_alias = options.get("SHARED", "shared")
+        self._l1_max_entries = options.get("L1_MAX_ENTRIES", 1000)
+        self._l1_timeout = options.get("L1_TIMEOUT", 5)
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+        # Django creates an instance per thread; the counts are kept for
+        # the whole process.
+        self.stats = cache_stats
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    # Local tier.
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return MISSING
+            pickled, expires = entry
+            if expires <= time.monotonic():
+                del self._l1[key]
+                return MISSING
+            self._l1.move_to_end(key)
+        return pickle.loads(pickled)
+
+    def _l1_store(self, key, pickled, expires):
+        with self._lock:
+            self._l1[key] = (pickled, expires)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_set(self, key, value, timeout=DEFAULT_TIMEOUT):
+        """
+        Keep a local copy of a shared value.
+
+        Values read or written inside a transaction are only kept once the
+        transaction commits, so a rolled back write never lingers locally.
+        """
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            return
+        lifetime = min(self._l1_timeout, timeout or self._l1_timeout)
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        expires = time.monotonic() + lifetime
+        transaction.on_commit(lambda: self._l1_store(key, pickled, expires))
+
+    def _l1_delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._l1.pop(key, None)
+
+    def _local_key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    # Cache API.
+
+    def get(self, key, default=None, version=None):
+        local_key = self._local_key(key, version)
+        value = self._l1_get(local_key)
+        if value is not MISSING:
+            self.stats["l1_hits"] += 1
+            return value
+
+        value = self.shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            self.stats["misses"] += 1
+            return default
+        self.stats["l2_hits"] += 1
+        self._l1_set(local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._l1_get(self._local_key(key, version))
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        self.stats["l1_hits"] += len(found)
+
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            self.stats["l2_hits"] += len(shared)
+            self.stats["misses"] += len(missing) - len(shared)
+            for key, value in shared.items():
+                self._l1_set(self._local_key(key, version), value)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        local_key = self._local_key(key, version)
+        self._l1_delete(local_key)
+        self.shared.set(key, value, timeout=timeout, version=version)
+        self._l1_set(local_key, value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(*(self._local_key(key, version) for key in data))
+        failed = self.shared.set_many(data, timeout=timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self._l1_set(self._local_key(key, version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(self._local_key(key, version))
+        return self.shared.add(key, value, timeout=timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout=timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self._local_key(key, version))
+        return self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self._l1_delete(*(self._local_key(key, version) for key in keys))
+        self.shared.delete_many(keys, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self._local_key(key, version))
+        return self.shared.incr(key, delta=delta, version=version)
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version=version) is not MISSING
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.shared.clear()
+
+    def clear_local(self):
+        """Drop the local tier only."""
+        with self._lock:
+            self._l1.clear()
+
+
+# Single-flight rebuilds.
+
+_build_locks = [threading.Lock() for _ in range(64)]
+
+
+def _build_lock(key):
+    return _build_locks[zlib.crc32(key.encode()) % len(_build_locks)]
+
+
+def get_or_build(key, build, timeout=DEFAULT_TIMEOUT, cache=None, wait=5):
+    """
+    Return the cached value of `key`, calling `build()` to fill it on a
+    miss.
+
+    Only one caller rebuilds a cold key: threads of the same process wait
+    on a lock, and other processes wait (up to `wait` seconds) for the
+    process holding the shared build lock to store the value.
+    """
+    cache = cache or default_cache
+    value = cache.get(key, MISSING)
+    if value is not MISSING:
+        return value
+
+    with _build_lock(key):
+        value = cache.get(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        lock_key = f"build-lock:{key}"
+        if cache.add(lock_key, 1, wait * 2):
+            try:
+                value = build()
+                cache.set(key, value, timeout)
+            finally:
+                cache.delete(lock_key)
+            return value
+
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            value = cache.get(key, MISSING)
+            if value is not MISSING:
+                return value
+        return build()
+
+
+_async_build_locks = weakref.WeakKeyDictionary()
+
+
+def _async_build_lock(key):
+    # asyncio locks belong to one event loop, so each loop gets its own.
+    locks = _async_build_locks.setdefault(
+        asyncio.get_running_loop(), [asyncio.Lock() for _ in range(64)]
+    )
+    return locks[zlib.crc32(key.encode()) % len(locks)]
+
+
+async def aget_or_build(
+    key, build, timeout=DEFAULT_TIMEOUT, cache=None, wait=5
+):
+    """Async version of `get_or_build`; `build` is a coroutine function."""
+    cache = cache or default_cache
+    value = await cache.aget(key, MISSING)
+    if value is not MISSING:
+        return value
+
+    async with _async_build_lock(key):
+        value = await cache.aget(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        lock_key = f"build-lock:{key}"
+        if await cache.aadd(lock_key, 1, wait * 2):
+            try:
+                value = await build()
+                await cache.aset(key, value, timeout)
+            finally:
+                await cache.adelete(lock_key)
+            return value
+
+        deadline = time.monotonic() + wait
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            value = await cache.aget(key, MISSING)
+            if value is not MISSING:
+                return value
+        return await build()
+
+
+# Invalidation by generation.
+
+
+def generation(namespace, cache=None):
+    """
+    Return the current generation token of a namespace.
+
+    Cache keys that embed the token are invalidated all at once by
+    `bump_generation`, without having to know the keys.
+    """
+    cache = cache or default_cache
+    key = f"generation:{namespace}"
+    token = cache.get(key)
+    if token is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        token = cache.get(key)
+    return token
+
+
+async def ageneration(namespace, cache=None):
+    """Async version of `generation`."""
+    cache = cache or default_cache
+    key = f"generation:{namespace}"
+    token = await cache.aget(key)
+    if token is None:
+        await cache.aadd(key, uuid.uuid4().hex, None)
+        token = await cache.aget(key)
+    return token
+
+
+def bump_generation(namespace, cache=None):
+    cache = cache or default_cache
+    cache.set(f"generation:{namespace}", uuid.uuid4().hex, None)
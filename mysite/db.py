@@ -0,0 +1,94 @@
+"""
+SQLite tuning applied to every new database connection, and routing of
+reads to the replica database.
+
+WAL journaling lets readers proceed while a writer holds the lock, and the
+busy timeout makes writers wait for the lock instead of failing at once.
+"""
+
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+TEMP_STORES = {"DEFAULT", "FILE", "MEMORY"}
+
+
+def sqlite_pragmas(options):
+    """
+    Return the PRAGMA statements for `options` (the `SQLITE_PRAGMAS`
+    setting), rejecting unknown values.
+    """
+    choices = {
+        "journal_mode": JOURNAL_MODES,
+        "synchronous": SYNCHRONOUS_MODES,
+        "temp_store": TEMP_STORES,
+    }
+    statements = []
+    for name, value in options.items():
+        if name in choices:
+            value = str(value).upper()
+            if value not in choices[name]:
+                raise ValueError(f"Invalid SQLite {name}: {value}.")
+        elif name in ("busy_timeout", "mmap_size", "cache_size"):
+            value = int(value)
+        else:
+            raise ValueError(f"Unsupported SQLite pragma: {name}.")
+        statements.append(f"PRAGMA {name} = {value}")
+    return statements
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for statement in sqlite_pragmas(settings.SQLITE_PRAGMAS):
+            cursor.execute(statement)
+
+
+# Apps whose tables are only ever read from the primary.
+PRIMARY_ONLY_APPS = {"sessions", "django_cache"}
+
+# Whether reads may go to the replica. Only set while handling a request,
+# so management commands and workers always read from the primary.
+replica_reads = ContextVar("replica_reads", default=False)
+# Whether the current request has written to the primary.
+wrote_primary = ContextVar("wrote_primary", default=False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Send writes to `default` and, where allowed, reads to `replica`.
+
+    Reads go to the replica only while `replica_reads` is set (see
+    `mysite.middleware.ReplicaStickinessMiddleware`), never inside a
+    transaction on the primary, and never for sessions and the cache
+    table. A write sends the rest of the request's reads to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if (
+            replica_reads.get()
+            and "replica" in settings.DATABASES
+            and model._meta.app_label not in PRIMARY_ONLY_APPS
+            and not connections["default"].in_atomic_block
+        ):
+            return "replica"
+        return "default"
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label not in PRIMARY_ONLY_APPS:
+            replica_reads.set(False)
+            wrote_primary.set(True)
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == "default"
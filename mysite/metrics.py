@@ -0,0 +1,392 @@
+"""
+Prometheus metrics shared by the worker processes of a server.
+
+Each process adds to the values in its own memory mapped file in
+`METRICS_DIR`, and the `/metrics` view adds up the files of all processes,
+so any worker can answer a scrape. A scrape folds the files of stopped
+workers into one file of their totals, so totals never go down and the
+directory does not grow as workers are replaced. Processes are told apart
+by pid, so the directory must not be shared between hosts.
+"""
+
+import fcntl
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+INF = float("inf")
+# Totals of the processes that have stopped.
+STOPPED_FILE = "stopped.db"
+
+# Metrics in the order they are exposed.
+metrics = []
+
+
+def _entries(data, used):
+    """Yield the (key, value offset, value) of the entries of a file."""
+    offset = 8
+    while offset < used:
+        (length,) = struct.unpack_from("I", data, offset)
+        key = bytes(data[offset + 4 : offset + 4 + length]).decode()
+        offset = (offset + 4 + length + 7) & ~7
+        (value,) = struct.unpack_from("d", data, offset)
+        yield key, offset, value
+        offset += 8
+
+
+class ValueFile:
+    """
+    Float values by key in a memory mapped file written by one process.
+
+    The file starts with the number of bytes in use, followed by entries of
+    a key length, the UTF-8 key padded to 8 bytes and a double. An entry
+    is written before the number of bytes in use covers it, so readers
+    never see a partial entry.
+    """
+
+    INITIAL_SIZE = 64 * 1024
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < 8:
+            size = self.INITIAL_SIZE
+            self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._used = struct.unpack_from("Q", self._map, 0)[0] or 8
+        self._offsets = {
+            key: offset for key, offset, _ in _entries(self._map, self._used)
+        }
+
+    def _offset(self, key):
+        offset = self._offsets.get(key)
+        if offset is not None:
+            return offset
+        encoded = key.encode()
+        offset = (self._used + 4 + len(encoded) + 7) & ~7
+        end = offset + 8
+        if end > len(self._map):
+            size = max(len(self._map) * 2, end)
+            self._map.close()
+            self._file.truncate(size)
+            self._map = mmap.mmap(self._file.fileno(), size)
+        struct.pack_into("I", self._map, self._used, len(encoded))
+        self._map[self._used + 4 : self._used + 4 + len(encoded)] = encoded
+        struct.pack_into("d", self._map, offset, 0.0)
+        struct.pack_into("Q", self._map, 0, end)
+        self._used = end
+        self._offsets[key] = offset
+        return offset
+
+    def inc(self, key, amount=1.0):
+        with self._lock:
+            offset = self._offset(key)
+            (value,) = struct.unpack_from("d", self._map, offset)
+            struct.pack_into("d", self._map, offset, value + amount)
+
+    def set(self, key, value):
+        with self._lock:
+            offset = self._offset(key)
+            struct.pack_into("d", self._map, offset, value)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextmanager
+def _locked(directory, operation):
+    """Hold a lock on `directory` across processes."""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / "lock", "a") as lock:
+        fcntl.flock(lock, operation)
+        yield
+
+
+def _read_file(path):
+    data = path.read_bytes()
+    if len(data) < 8:
+        return {}
+    used = min(struct.unpack_from("Q", data, 0)[0], len(data))
+    return {key: value for key, _, value in _entries(data, used)}
+
+
+def read_directory(directory):
+    """Return the values of every file in `directory`, added up by key."""
+    directory = Path(directory)
+    totals = defaultdict(float)
+    with _locked(directory, fcntl.LOCK_SH):
+        for path in sorted(directory.glob("*.db")):
+            for key, value in _read_file(path).items():
+                totals[key] += value
+    return totals
+
+
+def fold_stopped(directory):
+    """
+    Add the values of the files of stopped processes to `STOPPED_FILE` and
+    delete those files.
+    """
+    directory = Path(directory)
+    stopped = None
+    # Readers wait, so a scrape never counts a file and its folded values.
+    with _locked(directory, fcntl.LOCK_EX):
+        for path in sorted(directory.glob("*.db")):
+            if not path.stem.isdigit() or _pid_alive(int(path.stem)):
+                continue
+            if stopped is None:
+                stopped = ValueFile(directory / STOPPED_FILE)
+            for key, value in _read_file(path).items():
+                stopped.inc(key, value)
+            path.unlink()
+        if stopped is not None:
+            stopped.close()
+
+
+_value_file = None
+_value_file_lock = threading.Lock()
+
+
+def value_file():
+    """The file of this process, reopened after a fork or a new directory."""
+    global _value_file
+    path = Path(settings.METRICS_DIR) / f"{os.getpid()}.db"
+    current = _value_file
+    if current is None or current.path != path:
+        with _value_file_lock:
+            if _value_file is None or _value_file.path != path:
+                _value_file = ValueFile(path)
+            current = _value_file
+    return current
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        metrics.append(self)
+
+    def _labels(self, labels):
+        return [[name, str(labels[name])] for name in self.labelnames]
+
+    def _key(self, name, labels):
+        return json.dumps([name, labels])
+
+    def samples(self, values):
+        """Yield the (name, labels, value) of the samples to expose."""
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        value_file().inc(self._key(self.name, self._labels(labels)), amount)
+
+    def set(self, value, **labels):
+        """Set the total of this process, for counts kept elsewhere."""
+        value_file().set(self._key(self.name, self._labels(labels)), value)
+
+    def samples(self, values):
+        for labels, value in sorted(values[self.name].items()):
+            yield self.name, labels, value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(float(bound) for bound in buckets) + (INF,)
+
+    def observe(self, value, **labels):
+        labels = self._labels(labels)
+        bound = self.buckets[bisect_left(self.buckets, value)]
+        values = value_file()
+        # Buckets are stored per bucket and made cumulative when exposed.
+        values.inc(
+            self._key(f"{self.name}_bucket", labels + [["le", bound]]), 1
+        )
+        values.inc(self._key(f"{self.name}_sum", labels), value)
+        values.inc(self._key(f"{self.name}_count", labels), 1)
+
+    def samples(self, values):
+        buckets = values[f"{self.name}_bucket"]
+        sums = values[f"{self.name}_sum"]
+        for labels, count in sorted(values[f"{self.name}_count"].items()):
+            cumulative = 0
+            for bound in self.buckets:
+                cumulative += buckets.get(labels + (("le", bound),), 0)
+                yield (
+                    f"{self.name}_bucket",
+                    labels + (("le", bound),),
+                    cumulative,
+                )
+            yield f"{self.name}_sum", labels, sums.get(labels, 0)
+            yield f"{self.name}_count", labels, count
+
+
+class CallbackGauge(Metric):
+    """
+    A gauge computed when scraped by `function`, which gets the added up
+    values of the other metrics and returns (labels dict, value) pairs.
+    A gauge whose function fails is left out of that scrape.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, function):
+        super().__init__(name, documentation)
+        self.function = function
+
+    def samples(self, values):
+        try:
+            samples = list(self.function(values))
+        except Exception:
+            logger.exception("Could not compute the %s gauge", self.name)
+            return
+        for labels, value in samples:
+            yield self.name, tuple(labels.items()), value
+
+
+def _escape(value):
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\n", "\\n")
+        .replace('"', '\\"')
+    )
+
+
+def _format_value(value):
+    if value == INF:
+        return "+Inf"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _format_bounds(labels):
+    for label, value in labels:
+        yield label, _format_value(value) if label == "le" else value
+
+
+def render(directory=None):
+    """Return all metrics in the Prometheus text format."""
+    directory = directory or settings.METRICS_DIR
+    fold_stopped(directory)
+    values = defaultdict(dict)
+    for key, value in read_directory(directory).items():
+        name, labels = json.loads(key)
+        values[name][tuple((label, v) for label, v in labels)] = value
+
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for name, labels, value in metric.samples(values):
+            if labels:
+                pairs = ",".join(
+                    f'{label}="{_escape(v)}"'
+                    for label, v in _format_bounds(labels)
+                )
+                name = f"{name}{{{pairs}}}"
+            lines.append(f"{name} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """
+    Expose the metrics to holders of `METRICS_TOKEN`. Without a token
+    configured, nobody can read them.
+    """
+    token = settings.METRICS_TOKEN
+    if not token or not constant_time_compare(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
+
+
+REQUESTS = Counter(
+    "django_http_requests_total",
+    "Requests by view, method and status.",
+    ("view", "method", "status"),
+)
+REQUEST_LATENCY = Histogram(
+    "django_http_request_duration_seconds",
+    "Request latency by view.",
+    ("view",),
+    LATENCY_BUCKETS,
+)
+DB_QUERIES = Histogram(
+    "django_db_queries_per_request",
+    "SQL queries per request by view.",
+    ("view",),
+    (1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+DB_DURATION = Histogram(
+    "django_db_duration_seconds",
+    "Time spent in SQL queries per request by view.",
+    ("view",),
+    LATENCY_BUCKETS,
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Lookups in the default cache by result.",
+    ("result",),
+)
+
+
+def _cache_hit_ratios(values):
+    lookups = {
+        dict(labels)["result"]: value
+        for labels, value in values["cache_lookups_total"].items()
+    }
+    total = sum(lookups.values())
+    if not total:
+        return []
+    return [
+        ({"tier": "local"}, lookups.get("l1_hits", 0) / total),
+        (
+            {"tier": "any"},
+            (lookups.get("l1_hits", 0) + lookups.get("l2_hits", 0)) / total,
+        ),
+    ]
+
+
+CACHE_HIT_RATIO = CallbackGauge(
+    "cache_hit_ratio",
+    "Share of default cache lookups answered by the local tier or by any.",
+    _cache_hit_ratios,
+)
@@ -0,0 +1,210 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from mysite import metrics
+from mysite.cache import cache_stats
+from mysite.db import replica_reads, wrote_primary
+from mysite.profiling import (
+    QueryTally,
+    RequestProfile,
+    current_profile,
+    current_queries,
+    server_timing,
+)
+
+profile_logger = logging.getLogger("mysite.profiling")
+
+STICKY_COOKIE = "use_primary"
+
+
+class ReplicaStickinessMiddleware:
+    """
+    Let requests read from the replica, except for clients that wrote to
+    the primary in the last `REPLICA_STICKY_SECONDS`, so a user always
+    reads their own writes while the replica catches up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        tokens = self.start(request)
+        try:
+            return self.finish(self.get_response(request))
+        finally:
+            self.reset(tokens)
+
+    async def __acall__(self, request):
+        tokens = self.start(request)
+        try:
+            return self.finish(await self.get_response(request))
+        finally:
+            self.reset(tokens)
+
+    def start(self, request):
+        return (
+            replica_reads.set(STICKY_COOKIE not in request.COOKIES),
+            wrote_primary.set(False),
+        )
+
+    def finish(self, response):
+        if wrote_primary.get():
+            response.set_cookie(
+                STICKY_COOKIE,
+                "1",
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+    def reset(self, tokens):
+        reads, wrote = tokens
+        replica_reads.reset(reads)
+        wrote_primary.reset(wrote)
+
+
+class RequestProfilingMiddleware:
+    """
+    Measure SQL, template and view time of a sample of the requests
+    (`REQUEST_PROFILING_SAMPLE_RATE`) and report it in a `Server-Timing`
+    header and a JSON log line. Statements run at least
+    `REQUEST_PROFILING_REPEAT_THRESHOLD` times, the usual sign of an N+1
+    query, are logged as a warning.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.sampled():
+            return self.get_response(request)
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.report(request, response, profile)
+
+    async def __acall__(self, request):
+        if not self.sampled():
+            return await self.get_response(request)
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.report(request, response, profile)
+
+    def sampled(self):
+        return random.random() < settings.REQUEST_PROFILING_SAMPLE_RATE
+
+    def report(self, request, response, profile):
+        timings = profile.timings()
+        repeated = profile.repeated(
+            settings.REQUEST_PROFILING_REPEAT_THRESHOLD
+        )
+        response["Server-Timing"] = server_timing(
+            timings, profile.query_count, repeated
+        )
+        match = request.resolver_match
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            **timings,
+            "queries": profile.query_count,
+            "templates": profile.templates,
+            "repeated": [
+                {"sql": sql[:200], "count": count} for sql, count in repeated
+            ],
+        }
+        profile_logger.log(
+            logging.WARNING if repeated else logging.INFO,
+            json.dumps(record),
+            extra={"profile": record},
+        )
+        return response
+
+
+METRIC_METHODS = frozenset(
+    ("GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS")
+)
+
+
+class MetricsMiddleware:
+    """
+    Count requests and record their latency, SQL query count and SQL time
+    by resolved URL name for the `/metrics` view.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started, tally = time.perf_counter(), QueryTally()
+        token = current_queries.set(tally)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.record(request, response, started, tally)
+        return response
+
+    async def __acall__(self, request):
+        started, tally = time.perf_counter(), QueryTally()
+        token = current_queries.set(tally)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.record(request, response, started, tally)
+        return response
+
+    def record(self, request, response, started, tally):
+        match = request.resolver_match
+        # Unmatched paths share one label, so scanners cannot add series.
+        view = match.view_name if match else "unmatched"
+        # Likewise for made-up methods.
+        method = (
+            request.method if request.method in METRIC_METHODS else "other"
+        )
+        metrics.REQUESTS.inc(
+            view=view, method=method, status=response.status_code
+        )
+        metrics.REQUEST_LATENCY.observe(
+            time.perf_counter() - started, view=view
+        )
+        metrics.DB_QUERIES.observe(tally.count, view=view)
+        metrics.DB_DURATION.observe(tally.seconds, view=view)
+        for result in ("l1_hits", "l2_hits", "misses"):
+            metrics.CACHE_LOOKUPS.set(cache_stats[result], result=result)
@@ -0,0 +1,159 @@
+"""
+Per-request profiling: SQL query count and time, repeated queries and
+template render time of a sample of the requests, and the query count
+and time of every request for the metrics.
+
+A query wrapper is installed on every database connection when it is
+created and a template backend times rendering. They only record while
+a request has set `current_profile` or `current_queries`, so anything else
+pays for a context variable lookup per query.
+"""
+
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.template import TemplateDoesNotExist
+from django.template.backends.django import (
+    DjangoTemplates,
+    Template,
+    reraise,
+)
+
+# The profile of the request being handled, if it is sampled.
+current_profile = ContextVar("current_profile", default=None)
+# Query count and time of the request being handled, for the metrics.
+current_queries = ContextVar("current_queries", default=None)
+
+
+class QueryTally:
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+class RequestProfile:
+    """Timings collected while handling one request, in seconds."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.query_count = 0
+        self.query_time = 0.0
+        self.statements = Counter()
+        self.template_time = 0.0
+        # Time spent in queries run while a template renders, e.g. by
+        # querysets evaluated in the template.
+        self.template_query_time = 0.0
+        self.templates = []
+        self.template_depth = 0
+
+    def add_query(self, sql, duration):
+        self.query_count += 1
+        self.query_time += duration
+        self.statements[sql] += 1
+        if self.template_depth:
+            self.template_query_time += duration
+
+    def add_template(self, name, duration):
+        self.templates.append(name)
+        self.template_time += duration
+
+    def repeated(self, threshold):
+        """Statements run at least `threshold` times, most frequent first."""
+        return [
+            (sql, count)
+            for sql, count in self.statements.most_common()
+            if count >= threshold
+        ]
+
+    def timings(self):
+        """
+        Return the total time and its split into database, template and
+        remaining view time, in milliseconds.
+        """
+        total = time.perf_counter() - self.started
+        template = self.template_time - self.template_query_time
+        view = max(total - self.query_time - template, 0)
+        return {
+            "total_ms": round(total * 1000, 2),
+            "db_ms": round(self.query_time * 1000, 2),
+            "template_ms": round(template * 1000, 2),
+            "view_ms": round(view * 1000, 2),
+        }
+
+
+def server_timing(timings, query_count, repeated):
+    """Format timings as the value of a `Server-Timing` header."""
+    metrics = [
+        f'db;dur={timings["db_ms"]};desc="{query_count} queries"',
+        f'tpl;dur={timings["template_ms"]}',
+        f'view;dur={timings["view_ms"]}',
+        f'total;dur={timings["total_ms"]}',
+    ]
+    if repeated:
+        metrics.append(
+            f'repeated;desc="statements: {len(repeated)}, '
+            f'most runs: {repeated[0][1]}"'
+        )
+    return ", ".join(metrics)
+
+
+def record_query(execute, sql, params, many, context):
+    profile = current_profile.get()
+    tally = current_queries.get()
+    if profile is None and tally is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        if profile is not None:
+            profile.add_query(sql, duration)
+        if tally is not None:
+            tally.count += 1
+            tally.seconds += duration
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    # Reconnecting fires the signal again for the same wrapper.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class ProfiledTemplate(Template):
+    def render(self, context=None, request=None):
+        profile = current_profile.get()
+        if profile is None:
+            return super().render(context, request)
+        profile.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            profile.template_depth -= 1
+            # Templates rendered by other templates are part of their time.
+            if not profile.template_depth:
+                profile.add_template(
+                    self.template.name, time.perf_counter() - started
+                )
+
+
+class ProfiledDjangoTemplates(DjangoTemplates):
+    """The Django template backend, timing renders of sampled requests."""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        try:
+            return ProfiledTemplate(
+                self.engine.get_template(template_name), self
+            )
+        except TemplateDoesNotExist as exc:
+            reraise(exc, self)
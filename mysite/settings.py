@@ -33,6 +33,7 @@ ALLOWED_HOSTS = [host.strip() for host in config("ALLOWED_HOSTS").split(",")]
 # Application definition
 
 INSTALLED_APPS = [
+    "mysite.apps.MysiteConfig",
     "login.apps.AuthConfig",
     "polls.apps.PollsConfig",
     "django.contrib.admin",
@@ -45,6 +46,9 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "mysite.middleware.MetricsMiddleware",
+    "mysite.middleware.RequestProfilingMiddleware",
+    "mysite.middleware.ReplicaStickinessMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -57,7 +61,8 @@ ROOT_URLCONF = "mysite.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # The Django backend, timing renders for request profiling.
+        "BACKEND": "mysite.profiling.ProfiledDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -73,6 +78,35 @@ TEMPLATES = [
 WSGI_APPLICATION = "mysite.wsgi.application"
 
 
+# Request profiling
+# Share of requests whose SQL, template and view time is reported in a
+# Server-Timing header and logged by the "mysite.profiling" logger.
+REQUEST_PROFILING_SAMPLE_RATE = config(
+    "REQUEST_PROFILING_SAMPLE_RATE", default=0.01, cast=float
+)
+# Runs of one SQL statement in a request that are reported as repeated.
+REQUEST_PROFILING_REPEAT_THRESHOLD = config(
+    "REQUEST_PROFILING_REPEAT_THRESHOLD", default=5, cast=int
+)
+
+# Metrics
+# Each worker process keeps its metrics in a file in this directory, which
+# must be local to the host. Files of stopped workers are folded into one.
+METRICS_DIR = config("METRICS_DIR", default=str(BASE_DIR / "var" / "metrics"))
+# /metrics requires an "Authorization: Bearer <token>" header and is closed
+# while no token is set.
+METRICS_TOKEN = config("METRICS_TOKEN", default="")
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "mysite.profiling": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -80,7 +114,35 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+    },
+    # Read-only copy of the primary, e.g. kept in sync by LiteFS or
+    # Litestream. Defaults to the primary file itself.
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": config(
+            "REPLICA_DATABASE_NAME", default=BASE_DIR / "db.sqlite3"
+        ),
+        # Tests share the primary's data; SeparateReplicaTests swap in a
+        # copy to check which database each query uses.
+        "TEST": {"MIRROR": "default"},
+    },
+}
+
+DATABASE_ROUTERS = ["mysite.db.PrimaryReplicaRouter"]
+
+# Seconds a client keeps reading from the primary after writing to it.
+REPLICA_STICKY_SECONDS = config("REPLICA_STICKY_SECONDS", default=10, cast=int)
+
+# Applied to every SQLite connection by mysite.db.configure_sqlite.
+SQLITE_PRAGMAS = {
+    "journal_mode": config("SQLITE_JOURNAL_MODE", default="WAL"),
+    "synchronous": config("SQLITE_SYNCHRONOUS", default="NORMAL"),
+    # Milliseconds a writer waits for the lock before failing.
+    "busy_timeout": config("SQLITE_BUSY_TIMEOUT", default=5000, cast=int),
+    "mmap_size": config("SQLITE_MMAP_SIZE", default=268435456, cast=int),
+    # Negative values are KiB, so -64000 is about 64 MB per connection.
+    "cache_size": config("SQLITE_CACHE_SIZE", default=-64000, cast=int),
+    "temp_store": config("SQLITE_TEMP_STORE", default="MEMORY"),
 }
 
 
@@ -143,3 +205,79 @@ SECURE_HSTS_PRELOAD = False
 
 SESSION_COOKIE_SECURE = False
 CSRF_COOKIE_SECURE = False
+
+# Cache settings
+# A small per-process LRU in front of a database cache shared by all
+# workers. Create its table with `python manage.py createcachetable`.
+
+CACHES = {
+    "default": {
+        "BACKEND": "mysite.cache.TieredCache",
+        "OPTIONS": {
+            "SHARED": "shared",
+            "L1_MAX_ENTRIES": config(
+                "CACHE_L1_MAX_ENTRIES", default=1000, cast=int
+            ),
+            # Seconds a worker may serve its local copy of a shared entry.
+            "L1_TIMEOUT": config("CACHE_L1_TIMEOUT", default=5, cast=int),
+        },
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": config("CACHE_TABLE", default="cache_table"),
+        "TIMEOUT": 300,
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+# Seconds the rendered data of list and detail pages stays cached.
+PAGE_CACHE_TIMEOUT = config("PAGE_CACHE_TIMEOUT", default=300, cast=int)
+
+# File upload settings
+
+FILE_UPLOAD_HANDLERS = [
+    "login.utils.file_utils.MaxSizeUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+FILE_UPLOAD_DIR = config(
+    "FILE_UPLOAD_DIR", default=str(BASE_DIR / "var" / "uploads")
+)
+# Largest accepted upload, in bytes.
+FILE_UPLOAD_MAX_SIZE = config(
+    "FILE_UPLOAD_MAX_SIZE", default=50 * 1024 * 1024, cast=int
+)
+# Total size of the files a user may upload, in bytes.
+FILE_UPLOAD_USER_QUOTA = config(
+    "FILE_UPLOAD_USER_QUOTA", default=500 * 1024 * 1024, cast=int
+)
+# Lines of a stored file shown per page.
+FILE_VIEW_PAGE_LINES = config("FILE_VIEW_PAGE_LINES", default=200, cast=int)
+# Every this many lines, the line index records a line start.
+FILE_LINE_INDEX_STRIDE = config("FILE_LINE_INDEX_STRIDE", default=64, cast=int)
+
+# Poll settings
+
+# Votes are logged here and added to the database in batches.
+VOTE_LOG_DIR = config("VOTE_LOG_DIR", default=str(BASE_DIR / "var" / "votes"))
+VOTE_FLUSH_SIZE = config("VOTE_FLUSH_SIZE", default=100, cast=int)
+VOTE_FLUSH_INTERVAL = config("VOTE_FLUSH_INTERVAL", default=5, cast=float)
+
+# Quiz settings
+
+# Number of quiz snapshots each worker keeps in memory.
+QUIZ_SNAPSHOT_CACHE_SIZE = config(
+    "QUIZ_SNAPSHOT_CACHE_SIZE", default=128, cast=int
+)
+
+# OTP settings
+
+OTP_EXPIRE_TIME = config("OTP_EXPIRE_TIME", default=300, cast=int)
+OTP_MAX_ATTEMPTS = config("OTP_MAX_ATTEMPTS", default=5, cast=int)
+# (capacity, seconds to regain one request) per email address and client IP.
+OTP_EMAIL_RATE = (3, 300)
+OTP_IP_RATE = (10, 60)
+
+# Login throttling: (attempts, seconds) per client IP and failures per username.
+LOGIN_IP_RATE = (30, 60)
+LOGIN_USERNAME_RATE = (5, 300)
@@ -0,0 +1,25 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from polls.models import VoteBatch
+from polls.votes import vote_buffer
+
+
+class Command(BaseCommand):
+    help = "Apply buffered votes left behind by stopped or crashed workers."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--keep-days",
+            type=int,
+            default=7,
+            help="Days applied batch names are kept to reject replays.",
+        )
+
+    def handle(self, *args, **options):
+        votes = vote_buffer.replay()
+        cutoff = timezone.now() - datetime.timedelta(days=options["keep_days"])
+        VoteBatch.objects.filter(applied_at__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f"Applied {votes} votes."))
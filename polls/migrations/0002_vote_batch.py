@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('polls', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('applied_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
@@ -21,4 +21,14 @@ class Choice(models.Model):
     votes = models.IntegerField(default=0)
 
     def __str__(self):
-        return self.choice_text
\ No newline at end of file
+        return self.choice_text
+
+
+class VoteBatch(models.Model):
+    """A vote log whose votes have been added to the choices."""
+
+    name = models.CharField(max_length=100, unique=True)
+    applied_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
@@ -0,0 +1,27 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from mysite.cache import bump_generation
+
+from .models import Choice, Question
+
+# Generation of the cached question list of the index page.
+INDEX_NAMESPACE = "polls-index"
+
+
+def question_namespace(question_id):
+    """Generation of the cached detail and results data of a question."""
+    return f"polls-question:{question_id}"
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def invalidate_question(sender, instance, **kwargs):
+    bump_generation(INDEX_NAMESPACE)
+    bump_generation(question_namespace(instance.pk))
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def invalidate_choice(sender, instance, **kwargs):
+    bump_generation(question_namespace(instance.question_id))
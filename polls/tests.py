@@ -1,10 +1,17 @@
 import datetime
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
 
+from django.core.cache import cache
 from django.test import TestCase
 from django.urls import reverse
 from django.utils import timezone
 
-from .models import Question
+from .models import Choice, Question, VoteBatch
+from .votes import VoteBuffer, apply_batch, flush_due_votes
 
 
 class QuestionModelTests(TestCase):
@@ -130,3 +137,107 @@ class QuestionDetailViewTests(TestCase):
         url = reverse("polls:detail", args=(past_question.id,))
         response = self.client.get(url)
         self.assertContains(response, past_question.question_text)
+
+
+class QuestionResultsViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.buffer = VoteBuffer(directory.name, max_pending=3)
+        patcher = patch("polls.views.vote_buffer", self.buffer)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_results_are_cached(self):
+        question = create_question(question_text="Cached.", days=-1)
+        url = reverse("polls:results", args=(question.id,))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertContains(response, question.question_text)
+
+    def test_vote_invalidates_results(self):
+        question = create_question(question_text="Vote.", days=-1)
+        choice = question.choice_set.create(choice_text="Yes")
+        url = reverse("polls:results", args=(question.id,))
+        self.assertContains(self.client.get(url), "0 votes")
+        self.client.post(
+            reverse("polls:vote", args=(question.id,)), {"choice": choice.id}
+        )
+        self.assertContains(self.client.get(url), "1 vote")
+
+
+class VoteBufferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.buffer = VoteBuffer(self.directory, max_pending=3)
+        question = create_question(question_text="Buffered.", days=-1)
+        self.choice = question.choice_set.create(choice_text="Yes")
+
+    def votes(self):
+        return Choice.objects.get(pk=self.choice.pk).votes
+
+    def test_votes_are_written_in_batches(self):
+        self.buffer.record(self.choice.id)
+        self.buffer.record(self.choice.id)
+        self.assertEqual(self.votes(), 0)
+        self.assertEqual(
+            self.buffer.pending([self.choice.id]), {self.choice.id: 2}
+        )
+
+        self.buffer.record(self.choice.id)
+        self.assertEqual(self.votes(), 3)
+        self.assertEqual(self.buffer.pending([self.choice.id]), {})
+
+    def test_old_votes_are_applied_after_a_request(self):
+        self.buffer.record(self.choice.id)
+        with patch("polls.votes.vote_buffer", self.buffer):
+            flush_due_votes(sender=None)
+            self.assertEqual(self.votes(), 0)
+            later = time.monotonic() + self.buffer.flush_interval
+            with patch("polls.votes.time.monotonic", return_value=later):
+                flush_due_votes(sender=None)
+        self.assertEqual(self.votes(), 1)
+        self.assertEqual(self.buffer.pending([self.choice.id]), {})
+
+    def test_logs_of_dead_processes_are_replayed(self):
+        log = self.directory / "votes-999999999-crashed.log"
+        log.write_text(f"{self.choice.id}\n{self.choice.id}\n{self.choice.id}")
+        with patch("polls.votes._pid_alive", return_value=False):
+            self.assertEqual(self.buffer.replay(), 2)
+        self.assertEqual(self.votes(), 2)
+        self.assertFalse(os.listdir(self.directory))
+
+    def test_applied_batch_is_not_counted_twice(self):
+        batch = self.directory / "votes-1-applied.batch"
+        batch.write_text(f"{self.choice.id}\n")
+        apply_batch(batch)
+        # The process crashed before the batch file was removed.
+        batch.write_text(f"{self.choice.id}\n")
+        self.assertEqual(self.buffer.pending([self.choice.id]), {})
+        self.assertEqual(self.buffer.replay(), 0)
+        self.assertEqual(self.votes(), 1)
+        self.assertTrue(VoteBatch.objects.filter(name=batch.name).exists())
+
+
+class AsyncPollViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    async def test_read_views_under_asgi(self):
+        question = await Question.objects.acreate(
+            question_text="Async question.", pub_date=timezone.now()
+        )
+        await question.choice_set.acreate(choice_text="Yes")
+        for url in (
+            reverse("polls:index"),
+            reverse("polls:detail", args=(question.id,)),
+            reverse("polls:results", args=(question.id,)),
+        ):
+            response = await self.async_client.get(url)
+            self.assertContains(response, "Async question.")
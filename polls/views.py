@@ -1,39 +1,98 @@
-from django.db.models import F
-from django.http import HttpResponseRedirect
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
 from django.utils import timezone
 from django.views import generic
 
+from mysite.cache import aget_or_build, ageneration
+
 from .models import Choice, Question
+from .signals import INDEX_NAMESPACE, question_namespace
+from .votes import vote_buffer
+
+# Seconds the index list is cached, so questions published in the future
+# show up without a model change.
+INDEX_CACHE_TIMEOUT = 60
 
 
-class IndexView(generic.ListView):
+class IndexView(generic.View):
     template_name = "polls/index.html"
-    context_object_name = "latest_question_list"
 
-    def get_queryset(self):
+    async def get_questions(self):
         """Return the last five published questions."""
-        return Question.objects.filter(pub_date__lte=timezone.now()).order_by(
-            "-pub_date"
-        )[:5]
+        return [
+            question
+            async for question in Question.objects.filter(
+                pub_date__lte=timezone.now()
+            ).order_by("-pub_date")[:5]
+        ]
+
+    async def get(self, request):
+        questions = await aget_or_build(
+            f"polls-index:{await ageneration(INDEX_NAMESPACE)}",
+            self.get_questions,
+            INDEX_CACHE_TIMEOUT,
+        )
+        return render(
+            request, self.template_name, {"latest_question_list": questions}
+        )
+
+
+class CachedQuestionView(generic.View):
+    """Render a question and its choices served from the cache."""
 
+    template_name = None
 
-class DetailView(generic.DetailView):
-    model = Question
+    async def get_question(self, question_id):
+        key = (
+            f"polls-question:{question_id}:"
+            f"{await ageneration(question_namespace(question_id))}"
+        )
+        question = await aget_or_build(
+            key,
+            lambda: Question.objects.prefetch_related("choice_set")
+            .filter(pk=question_id)
+            .afirst(),
+            settings.PAGE_CACHE_TIMEOUT,
+        )
+        if question is None or not self.is_visible(question):
+            raise Http404("No question found.")
+        return question
+
+    def is_visible(self, question):
+        return True
+
+    async def get(self, request, pk):
+        question = await self.get_question(pk)
+        return render(request, self.template_name, {"question": question})
+
+
+class DetailView(CachedQuestionView):
     template_name = "polls/detail.html"
 
-    def get_queryset(self):
+    def is_visible(self, question):
         """
         Excludes any questions that aren't published yet.
         """
-        return Question.objects.filter(pub_date__lte=timezone.now())
+        return question.pub_date <= timezone.now()
 
 
-class ResultsView(generic.DetailView):
-    model = Question
+class ResultsView(CachedQuestionView):
     template_name = "polls/results.html"
 
+    async def get_question(self, question_id):
+        """Add the votes that are still buffered to the stored counts."""
+        question = await super().get_question(question_id)
+        choices = question.choice_set.all()
+        pending = await sync_to_async(vote_buffer.pending)(
+            [choice.id for choice in choices]
+        )
+        for choice in choices:
+            choice.votes += pending[choice.id]
+        return question
+
 
 def detail(request, question_id):
     question = get_object_or_404(Question, pk=question_id)
@@ -55,8 +114,7 @@ def vote(request, question_id):
             },
         )
     else:
-        selected_choice.votes = F("votes") + 1
-        selected_choice.save()
+        vote_buffer.record(selected_choice.id)
         # Always return an HttpResponseRedirect after successfully dealing
         # with POST data. This prevents data from being posted twice if a
         # user hits the Back button.
@@ -0,0 +1,212 @@
+import atexit
+import os
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.dispatch import receiver
+
+from mysite.cache import bump_generation
+
+from .models import Choice, VoteBatch
+from .signals import question_namespace
+
+LOG_SUFFIX = ".log"
+BATCH_SUFFIX = ".batch"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def read_log(path):
+    """Count the votes per choice id of a log file."""
+    counts = Counter()
+    try:
+        with open(path) as log:
+            for line in log:
+                # A torn last line of a crashed process is ignored.
+                if line.endswith("\n") and line.strip().isdigit():
+                    counts[int(line)] += 1
+    except FileNotFoundError:
+        pass
+    return counts
+
+
+def apply_batch(path):
+    """
+    Add the votes of a sealed log file to the choices, once.
+
+    The batch name is stored in the same transaction as the updates, so a
+    batch replayed after a crash or by two processes at once is never
+    counted twice.
+    """
+    path = Path(path)
+    counts = read_log(path)
+    try:
+        with transaction.atomic():
+            VoteBatch.objects.create(name=path.name)
+            for choice_id, votes in sorted(counts.items()):
+                Choice.objects.filter(pk=choice_id).update(
+                    votes=F("votes") + votes
+                )
+    except IntegrityError:
+        # The batch was already applied.
+        counts = Counter()
+    if counts:
+        question_ids = Choice.objects.filter(pk__in=counts).values_list(
+            "question_id", flat=True
+        )
+        for question_id in set(question_ids):
+            bump_generation(question_namespace(question_id))
+    path.unlink(missing_ok=True)
+    return counts
+
+
+class VoteBuffer:
+    """
+    Collect votes in an append-only log and add them to the database in
+    batches.
+
+    Each process appends to its own log file, so voting never waits for
+    the database write lock. The log is sealed and applied as one UPDATE
+    per choice once it holds `max_pending` votes or is `flush_interval`
+    seconds old, checked on each vote and after each request.
+    """
+
+    def __init__(self, directory, max_pending=100, flush_interval=5):
+        self.directory = Path(directory)
+        self.max_pending = max_pending
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._log = None
+        self._log_path = None
+        self._pending = 0
+        self._opened_at = 0
+        # Votes of this process not in the database yet, by choice id.
+        self._unapplied = Counter()
+        self._log_counts = Counter()
+
+    def _open_log(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        name = f"votes-{os.getpid()}-{uuid.uuid4().hex}{LOG_SUFFIX}"
+        self._log_path = self.directory / name
+        self._log = open(self._log_path, "a")
+        self._opened_at = time.monotonic()
+
+    def _due(self):
+        return self._log is not None and (
+            self._pending >= self.max_pending
+            or time.monotonic() - self._opened_at >= self.flush_interval
+        )
+
+    def _seal(self):
+        """
+        Close the current log and return its sealed path and votes, if
+        any.
+        """
+        if self._log is None:
+            return None
+        self._log.close()
+        sealed = self._log_path.with_suffix(BATCH_SUFFIX)
+        os.replace(self._log_path, sealed)
+        counts = self._log_counts
+        self._log = self._log_path = None
+        self._pending = 0
+        self._log_counts = Counter()
+        return sealed, counts
+
+    def _apply(self, sealed):
+        if sealed is None:
+            return
+        path, counts = sealed
+        try:
+            apply_batch(path)
+        finally:
+            # Votes of a batch that failed are applied by `replay`.
+            with self._lock:
+                self._unapplied -= counts
+
+    def record(self, choice_id):
+        choice_id = int(choice_id)
+        with self._lock:
+            if self._log is None:
+                self._open_log()
+            self._log.write(f"{choice_id}\n")
+            self._log.flush()
+            self._pending += 1
+            self._log_counts[choice_id] += 1
+            self._unapplied[choice_id] += 1
+            sealed = self._seal() if self._due() else None
+        self._apply(sealed)
+
+    def flush(self, only_due=False):
+        """
+        Apply the votes of this process now, or with `only_due` only if the
+        log is full or old enough.
+        """
+        with self._lock:
+            sealed = self._seal() if self._due() or not only_due else None
+        self._apply(sealed)
+
+    def _files(self, suffix):
+        if not self.directory.is_dir():
+            return []
+        return sorted(self.directory.glob(f"votes-*{suffix}"))
+
+    def replay(self):
+        """
+        Apply the sealed batches and the logs left behind by processes that
+        are gone. Returns the number of votes applied.
+        """
+        paths = self._files(BATCH_SUFFIX)
+        for path in self._files(LOG_SUFFIX):
+            pid = int(path.name.split("-")[1])
+            if path != self._log_path and not _pid_alive(pid):
+                sealed = path.with_suffix(BATCH_SUFFIX)
+                os.replace(path, sealed)
+                paths.append(sealed)
+        return sum(sum(apply_batch(path).values()) for path in paths)
+
+    def pending(self, choice_ids):
+        """
+        Count the votes of this process not yet in the database, for the
+        given choices. Votes of other processes show up once they flush.
+        """
+        with self._lock:
+            return Counter(
+                {
+                    choice_id: self._unapplied[choice_id]
+                    for choice_id in choice_ids
+                    if self._unapplied[choice_id]
+                }
+            )
+
+
+vote_buffer = VoteBuffer(
+    settings.VOTE_LOG_DIR,
+    max_pending=settings.VOTE_FLUSH_SIZE,
+    flush_interval=settings.VOTE_FLUSH_INTERVAL,
+)
+atexit.register(vote_buffer.flush)
+
+
+@receiver(request_finished)
+def flush_due_votes(sender, **kwargs):
+    """
+    Apply buffered votes once they are `flush_interval` seconds old, even
+    if no more votes come in.
+    """
+    vote_buffer.flush(only_due=True)